@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+class LegacyDatabase(Database):
+    @contextmanager
+    def _get_connection(self, write: bool = True):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+def run(db: Database, ops: int) -> dict:
+    results = {}
+    
+    started = time.perf_counter()
+    for i in range(ops):
+        db.add_user(i, f"User {i}", f"user{i}", 11520)
+    results['add_user'] = ops / (time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    for i in range(ops):
+        db.get_user(i)
+    results['get_user'] = ops / (time.perf_counter() - started)
+    
+    db.add_admin(1)
+    started = time.perf_counter()
+    for i in range(ops):
+        db.is_admin(i % 10)
+    results['is_admin'] = ops / (time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    for i in range(ops):
+        db.update_presence(i, True, i % 2 == 0)
+    results['update_presence'] = ops / (time.perf_counter() - started)
+    
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение производительности Database")
+    parser.add_argument('--ops', type=int, default=2000)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = run(LegacyDatabase(os.path.join(tmp, 'legacy.db')), args.ops)
+        pooled_db = Database(os.path.join(tmp, 'pooled.db'))
+        pooled = run(pooled_db, args.ops)
+        pooled_db.close()
+    
+    print(f"{'операция':<18}{'до, ops/s':>14}{'после, ops/s':>16}{'x':>8}")
+    for name in legacy:
+        print(f"{name:<18}{legacy[name]:>14.0f}{pooled[name]:>16.0f}{pooled[name] / legacy[name]:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Trial Bot', 'username': 'trial_bot'}
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_limit: float = 0,
+                 error_rate: float = 0.0, member_ratio: float = 1.0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.member_ratio = member_ratio
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.errors = Counter()
+        self._message_ids = itertools.count(1)
+        self._tokens = rate_limit
+        self._updated = time.monotonic()
+        self._runner = None
+    
+    def _rate_limited(self) -> bool:
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+        self._updated = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+    
+    def _message(self, params) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+    
+    def _chat_member(self, params) -> dict:
+        user = {'id': int(params['user_id']), 'is_bot': False, 'first_name': 'User'}
+        status = 'member' if random.random() < self.member_ratio else 'left'
+        return {'status': status, 'user': user}
+    
+    def _result(self, method: str, params):
+        if method == 'getme':
+            return BOT_USER
+        if method in ('sendmessage', 'senddocument', 'editmessagetext', 'editmessagereplymarkup',
+                      'copymessage', 'forwardmessage'):
+            return self._message(params)
+        if method == 'getchatmember':
+            return self._chat_member(params)
+        if method == 'getupdates':
+            return []
+        return True
+    
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        params = await request.post()
+        self.calls[method] += 1
+        
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        
+        if self._rate_limited():
+            self.errors[method] += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            }, status=429)
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors[method] += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 500,
+                'description': "Internal Server Error: injected",
+            }, status=500)
+        
+        return web.json_response({'ok': True, 'result': self._result(method, params)})
+    
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+    
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+    
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Bot API для нагрузочных тестов")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="Задержка ответа, с")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Случайная добавка к задержке, с")
+    parser.add_argument('--rate-limit', type=float, default=0, help="Запросов в секунду до ответа 429, 0 - без лимита")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument('--member-ratio', type=float, default=1.0, help="Доля getChatMember со статусом member")
+    args = parser.parse_args()
+    
+    api = FakeBotAPI(args.latency, args.jitter, args.rate_limit, args.error_rate, args.member_ratio)
+    
+    async def serve():
+        url = await api.start(args.host, args.port)
+        print(f"Bot API слушает {url}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await api.stop()
+            print(json.dumps(api.calls, indent=2))
+    
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from config import Config
+from database import AsyncDatabase, Database
+from handlers import router
+from ingest import JoinIngestor, JoinRecord
+from outbox import Outbox
+from scheduler import ExpiryScheduler
+from storage import create_storage
+from tenants import TenantRegistry
+
+WORK_CHAT_ID = -1001000000001
+STUDY_GROUP_ID = -1001000000002
+ADMIN_ID = 42
+ROSTER_OFFSET = 10 ** 6
+TRIAL_MINUTES = 8 * 24 * 60
+
+class CountingDatabase(AsyncDatabase):
+    ops = 0
+    
+    async def _run(self, executor, func, *args, **kwargs):
+        self.ops += 1
+        return await super()._run(executor, func, *args, **kwargs)
+
+def _user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}', 'username': f'user{user_id}'}
+
+def _chat(chat_id: int) -> dict:
+    return {'id': chat_id, 'type': 'supergroup', 'title': 'Chat'}
+
+def join_update(update_id: int, user_id: int) -> dict:
+    return {
+        'update_id': update_id,
+        'chat_join_request': {
+            'chat': _chat(WORK_CHAT_ID),
+            'from': _user(user_id),
+            'user_chat_id': user_id,
+            'date': int(time.time()),
+        },
+    }
+
+def leave_update(update_id: int, user_id: int, chat_id: int) -> dict:
+    return {
+        'update_id': update_id,
+        'chat_member': {
+            'chat': _chat(chat_id),
+            'from': _user(user_id),
+            'date': int(time.time()),
+            'old_chat_member': {'status': 'member', 'user': _user(user_id)},
+            'new_chat_member': {'status': 'left', 'user': _user(user_id)},
+        },
+    }
+
+def callback_update(update_id: int, user_id: int, action: str) -> dict:
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(ADMIN_ID),
+            'chat_instance': '1',
+            'data': f'{action}_{user_id}',
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': ADMIN_ID, 'type': 'private'},
+                'text': f'Пробный период завершен\n\nUser {user_id}',
+                'reply_markup': {'inline_keyboard': [[
+                    {'text': 'Оставить', 'callback_data': f'approve_{user_id}'},
+                    {'text': 'Кикнуть', 'callback_data': f'kick_{user_id}'},
+                ]]},
+            },
+        },
+    }
+
+def message_update(update_id: int, text: str) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': ADMIN_ID, 'type': 'private'},
+            'from': _user(ADMIN_ID),
+            'text': text,
+        },
+    }
+
+def seed_roster(db: Database, size: int, fresh_presence: bool = False):
+    now = time.time()
+    trial_seconds = TRIAL_MINUTES * 60
+    present = True if fresh_presence else None
+    records = []
+    for index in range(size):
+        if index % 4 == 0:
+            joined_at = now - trial_seconds - 60
+        elif index % 4 == 1:
+            joined_at = now - trial_seconds + 3600
+        else:
+            joined_at = now - 3600
+        records.append(JoinRecord(
+            ROSTER_OFFSET + index, f'User {index}', f'user{index}', TRIAL_MINUTES,
+            in_work=present, in_study=present, joined_at=joined_at
+        ))
+    for start in range(0, size, 10000):
+        db.ingest_joins(records[start:start + 10000])
+    db.add_admin(ADMIN_ID)
+
+def _percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+class Scenario:
+    def __init__(self, name: str, db: CountingDatabase, api: FakeBotAPI):
+        self.name = name
+        self.db = db
+        self.api = api
+        self.count = 0
+        self.latencies = []
+    
+    def __enter__(self):
+        self.ops = self.db.ops
+        self.calls = sum(self.api.calls.values())
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self.ops = self.db.ops - self.ops
+        self.calls = sum(self.api.calls.values()) - self.calls
+    
+    def row(self, roster: int) -> str:
+        latencies = self.latencies or [self.elapsed]
+        rate = self.count / self.elapsed if self.count else 0
+        return (f"{roster:>8}  {self.name:<16}{self.count:>8}{rate:>10.0f}"
+                f"{statistics.median(latencies) * 1000:>10.1f}{_percentile(latencies, 0.99) * 1000:>10.1f}"
+                f"{self.ops:>10}{self.calls:>10}")
+
+async def feed(dp: Dispatcher, bot: Bot, updates, concurrency: int, scenario: Scenario):
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def handle(data):
+        update = Update.model_validate(data, context={'bot': bot})
+        async with semaphore:
+            started = time.perf_counter()
+            await dp.feed_update(bot, update)
+            scenario.latencies.append(time.perf_counter() - started)
+    
+    await asyncio.gather(*(handle(data) for data in updates))
+    scenario.count = len(updates)
+
+async def run_roster(roster: int, args, dp: Dispatcher, api: FakeBotAPI, api_url: str) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = CountingDatabase(Database(os.path.join(tmp, 'bench.db')))
+        seed_roster(db.sync, roster, args.fresh_presence)
+        
+        bot = Bot('123456:benchmark', session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+        bot.session.middleware(Outbox(
+            global_rate=args.global_rate,
+            private_rate=args.chat_rate,
+            group_rate=args.chat_rate
+        ))
+        config = Config('123456:benchmark', WORK_CHAT_ID, STUDY_GROUP_ID, trial_minutes=TRIAL_MINUTES)
+        tenants = TenantRegistry(db)
+        await tenants.setup(config)
+        ingestor = JoinIngestor(db)
+        ingestor.start()
+        
+        dp.fsm.storage = await create_storage(config.fsm_storage, db)
+        dp['db'] = db
+        dp['config'] = config
+        dp['ingestor'] = ingestor
+        dp['tenants'] = tenants
+        
+        results = []
+        count = min(args.updates, roster // 4)
+        update_ids = iter(range(1, 10 ** 9))
+        
+        try:
+            with Scenario('join', db, api) as scenario:
+                await feed(dp, bot, [join_update(next(update_ids), user_id) for user_id in range(1, args.updates + 1)],
+                           args.concurrency, scenario)
+                await ingestor.flush()
+            results.append(scenario)
+            
+            with Scenario('callback', db, api) as scenario:
+                updates = [
+                    callback_update(next(update_ids), ROSTER_OFFSET + 4 * index + 2, 'approve' if index % 2 else 'kick')
+                    for index in range(count)
+                ]
+                await feed(dp, bot, updates, args.concurrency, scenario)
+            results.append(scenario)
+            
+            with Scenario('leave', db, api) as scenario:
+                updates = [
+                    leave_update(next(update_ids), 1 + index, WORK_CHAT_ID if index % 2 else STUDY_GROUP_ID)
+                    for index in range(min(args.updates, roster))
+                ]
+                await feed(dp, bot, updates, args.concurrency, scenario)
+            results.append(scenario)
+            
+            if not args.skip_presence:
+                with Scenario('check_presence', db, api) as scenario:
+                    await feed(dp, bot, [message_update(next(update_ids), "Проверка")], 1, scenario)
+                results.append(scenario)
+            
+            scheduler = ExpiryScheduler(bot, db, tenants, digest=True)
+            with Scenario('scheduler_resync', db, api) as scenario:
+                await scheduler.resync()
+                scenario.count = len(scheduler._deadlines)
+            results.append(scenario)
+            
+            with Scenario('scheduler_notify', db, api) as scenario:
+                due = scheduler._pop_due(time.time())
+                await scheduler._fire(due)
+                scenario.count = len(due)
+            results.append(scenario)
+            scheduler.shutdown()
+        finally:
+            await ingestor.stop()
+            await bot.session.close()
+            db.close()
+        
+        return results
+
+async def run(args):
+    api = FakeBotAPI(args.latency, args.jitter, args.rate_limit, args.error_rate, args.member_ratio)
+    api_url = await api.start()
+    dp = Dispatcher()
+    dp.include_router(router)
+    
+    print(f"{'ростер':>8}  {'сценарий':<16}{'событий':>8}{'в сек':>10}{'p50, мс':>10}{'p99, мс':>10}"
+          f"{'запр. БД':>10}{'запр. API':>10}")
+    try:
+        for roster in args.sizes:
+            for scenario in await run_roster(roster, args, dp, api, api_url):
+                print(scenario.row(roster))
+    finally:
+        await api.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота на локальном Bot API")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help="Размеры ростера (до 100000)")
+    parser.add_argument('--updates', type=int, default=1000, help="Событий на сценарий")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help="Задержка Bot API, с")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0, help="Лимит Bot API в секунду, 0 - без лимита")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 500 от Bot API")
+    parser.add_argument('--member-ratio', type=float, default=1.0, help="Доля пользователей, найденных в чатах")
+    parser.add_argument('--global-rate', type=float, default=10000, help="Глобальный лимит Outbox")
+    parser.add_argument('--chat-rate', type=float, default=10000, help="Лимит Outbox на чат")
+    parser.add_argument('--fresh-presence', action='store_true',
+                        help="Считать присутствие ростера недавно подтвержденным, чтобы 'Проверка' не запрашивала Telegram")
+    parser.add_argument('--skip-presence', action='store_true', help="Не запускать сценарий 'Проверка'")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
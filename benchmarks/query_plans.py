@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+EXPECTED_INDEXES = {
+    'get_pending_trials': 'idx_users_trial_pending',
+    'get_trial_page': 'idx_users_trial_page',
+    'get_all_users': 'idx_users_join_date',
+}
+
+METHOD_ARGS = {
+    'get_pending_trials': (2 ** 31,),
+}
+
+SEARCH_PLANS = {
+    'User 1': ('idx_users_name',),
+    'ser 1': ('idx_users_name', 'idx_users_username', 'users_search'),
+    '12': ('INTEGER PRIMARY KEY',),
+}
+
+def capture_queries(db: Database, method: str, *args) -> list:
+    statements = []
+    conn = db._connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        getattr(db, method)(*args)
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+def query_plan(db: Database, sql: str) -> list:
+    conn = db._connection()
+    return [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+
+def main() -> int:
+    failures = 0
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'plans.db'))
+        for i in range(200):
+            db.add_user(i, f"User {i}", None, 60 * i)
+        
+        for method, index in EXPECTED_INDEXES.items():
+            for sql in capture_queries(db, method, *METHOD_ARGS.get(method, ())):
+                plan = query_plan(db, sql)
+                ok = any(index in detail for detail in plan)
+                failures += not ok
+                print(f"{'OK  ' if ok else 'FAIL'} {method}: {'; '.join(plan)}")
+        
+        for query, indexes in SEARCH_PLANS.items():
+            for sql in capture_queries(db, 'search_users', query):
+                plan = query_plan(db, sql)
+                ok = any(index in detail for index in indexes for detail in plan)
+                failures += not ok
+                print(f"{'OK  ' if ok else 'FAIL'} search_users({query!r}): {'; '.join(plan)}")
+        
+        db.close()
+    
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
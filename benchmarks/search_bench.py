@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from ingest import JoinRecord
+
+FIRST_NAMES = ['Иван', 'Пётр', 'Анна', 'Мария', 'Ольга', 'Сергей', 'Alex', 'John', 'Kate', 'Дмитрий']
+LAST_NAMES = ['Иванов', 'Петрова', 'Смирнов', 'Кузнецова', 'Попов', 'Smith', 'Brown', 'Соколов']
+
+def seed(db: Database, rows: int):
+    records = [
+        JoinRecord(
+            10 ** 8 + index * 7919,
+            f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)} {index}",
+            f"user_{index}" if index % 2 else None,
+            11520
+        )
+        for index in range(rows)
+    ]
+    for start in range(0, rows, 10000):
+        db.ingest_joins(records[start:start + 10000])
+    return records
+
+def measure(db: Database, queries) -> list:
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        db.search_users(query)
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость поиска пользователей")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'search.db'))
+        records = seed(db, args.rows)
+        samples = random.sample(records, min(args.queries, len(records)))
+        
+        cases = {
+            'имя': [random.choice(FIRST_NAMES) for _ in samples],
+            'фамилия': [random.choice(LAST_NAMES)[:5] for _ in samples],
+            'тег': [f"@user_{random.randrange(1, args.rows, 2)}" for _ in samples],
+            'ID (начало)': [str(record.telegram_id)[:6] for record in samples],
+            'ID': [str(record.telegram_id) for record in samples],
+        }
+        
+        print(f"{'запрос':<14}{'p50, мс':>10}{'p99, мс':>10}")
+        for name, queries in cases.items():
+            timings = measure(db, queries)
+            print(f"{name:<14}{statistics.median(timings) * 1000:>10.2f}"
+                  f"{timings[int(len(timings) * 0.99) - 1] * 1000:>10.2f}")
+        db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import aiohttp
+
+def synthetic_updates(count: int, chat_id: int):
+    for update_id in range(1, count + 1):
+        user_id = random.randint(10 ** 8, 10 ** 9)
+        yield {
+            'update_id': update_id,
+            'chat_join_request': {
+                'chat': {'id': chat_id, 'type': 'supergroup', 'title': 'Work'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'},
+                'user_chat_id': user_id,
+                'date': int(time.time()),
+            },
+        }
+
+def recorded_updates(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+async def replay(url: str, secret: str, updates, concurrency: int):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+    
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(url, json=update) as response:
+                    await response.read()
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                latencies.append(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(post(update) for update in updates))
+        elapsed = time.perf_counter() - started
+    
+    return latencies, statuses, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка записанных обновлений на локальный webhook")
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default='')
+    parser.add_argument('--file', help="JSON lines с обновлениями Telegram")
+    parser.add_argument('--count', type=int, default=1000, help="Количество синтетических обновлений")
+    parser.add_argument('--chat-id', type=int, default=-1001234567890)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    
+    updates = list(recorded_updates(args.file) if args.file else synthetic_updates(args.count, args.chat_id))
+    latencies, statuses, elapsed = asyncio.run(replay(args.url, args.secret, updates, args.concurrency))
+    latencies.sort()
+    
+    print(f"обновлений: {len(updates)} за {elapsed:.2f} с ({len(updates) / elapsed:.0f} в секунду)")
+    print(f"ответы: {statuses}")
+    print(f"задержка p50: {statistics.median(latencies) * 1000:.1f} мс, "
+          f"p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} мс")
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import os
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class Config:
@@ -7,6 +8,18 @@ class Config:
     work_chat_id: int
     study_group_id: int
     trial_minutes: int = 11520
+    presence_max_age_minutes: int = 1440
+    notify_digest: bool = True
+    fsm_storage: str = 'sqlite'
+    webhook_url: Optional[str] = None
+    webhook_path: str = '/webhook'
+    webhook_secret: Optional[str] = None
+    webhook_host: str = '0.0.0.0'
+    webhook_port: int = 8080
+    metrics_host: str = '127.0.0.1'
+    metrics_port: int = 0
+    slow_update_ms: int = 1000
+    loop_lag_threshold_ms: int = 250
     
     @classmethod
     def from_env(cls):
@@ -14,5 +27,17 @@ class Config:
             bot_token=os.getenv('BOT_TOKEN'),
             work_chat_id=int(os.getenv('WORK_CHAT_ID')),
             study_group_id=int(os.getenv('STUDY_GROUP_ID')),
-            trial_minutes=int(os.getenv('TRIAL_MINUTES', '11520'))
+            trial_minutes=int(os.getenv('TRIAL_MINUTES', '11520')),
+            presence_max_age_minutes=int(os.getenv('PRESENCE_MAX_AGE_MINUTES', '1440')),
+            notify_digest=os.getenv('NOTIFY_DIGEST', '1') == '1',
+            fsm_storage=os.getenv('FSM_STORAGE', 'sqlite'),
+            webhook_url=os.getenv('WEBHOOK_URL') or None,
+            webhook_path=os.getenv('WEBHOOK_PATH', '/webhook'),
+            webhook_secret=os.getenv('WEBHOOK_SECRET') or None,
+            webhook_host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+            webhook_port=int(os.getenv('WEBHOOK_PORT', '8080')),
+            metrics_host=os.getenv('METRICS_HOST', '127.0.0.1'),
+            metrics_port=int(os.getenv('METRICS_PORT', '0')),
+            slow_update_ms=int(os.getenv('SLOW_UPDATE_MS', '1000')),
+            loop_lag_threshold_ms=int(os.getenv('LOOP_LAG_THRESHOLD_MS', '250'))
         )
\ No newline at end of file
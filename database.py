@@ -1,57 +1,343 @@
+import asyncio
+import logging
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Optional, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime
+from typing import Optional, List, Tuple
 from contextlib import contextmanager
 
+from metrics import DB_ERRORS, DB_SECONDS
+from tracing import add_span
+
+MAX_ID_DIGITS = 15
+SEARCH_CANDIDATES = 200
+READER_THREADS = 4
+MAX_CHAR = chr(0x10FFFF)
+ADMIN_REFRESH_SECONDS = 1
+
+UPDATE_PRESENCE_SQL = '''
+    UPDATE users SET
+        in_work_chat = COALESCE(?, in_work_chat),
+        work_seen_at = CASE WHEN ? IS NULL THEN work_seen_at ELSE ? END,
+        in_study_group = COALESCE(?, in_study_group),
+        study_seen_at = CASE WHEN ? IS NULL THEN study_seen_at ELSE ? END
+    WHERE telegram_id = ?
+'''
+
+UPDATE_TENANT_PRESENCE_SQL = UPDATE_PRESENCE_SQL.rstrip() + ' AND tenant_id IS ?'
+
+def _create_tables(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            telegram_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            username TEXT,
+            join_date TEXT NOT NULL,
+            trial_end_date TEXT NOT NULL,
+            status TEXT DEFAULT 'trial',
+            in_work_chat INTEGER DEFAULT 1,
+            in_study_group INTEGER DEFAULT 1,
+            notified_one_day INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS admins (
+            telegram_id INTEGER PRIMARY KEY
+        )
+    ''')
+
+def _create_trial_indexes(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_trial_deadline
+        ON users (trial_end_date, notified_one_day)
+        WHERE status = 'trial'
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_join_date
+        ON users (join_date)
+    ''')
+
+def _iso_to_epoch(value) -> Optional[int]:
+    if value is None or isinstance(value, (int, float)):
+        return value if value is None else int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+def _convert_dates_to_epoch(conn: sqlite3.Connection):
+    conn.create_function('iso_to_epoch', 1, _iso_to_epoch, deterministic=True)
+    conn.execute('''
+        CREATE TABLE users_new (
+            telegram_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            username TEXT,
+            join_date INTEGER NOT NULL,
+            trial_end_date INTEGER NOT NULL,
+            status TEXT DEFAULT 'trial',
+            in_work_chat INTEGER DEFAULT 1,
+            in_study_group INTEGER DEFAULT 1,
+            notified_one_day INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO users_new
+        SELECT telegram_id, name, username,
+               iso_to_epoch(join_date), iso_to_epoch(trial_end_date),
+               status, in_work_chat, in_study_group, notified_one_day
+        FROM users
+    ''')
+    conn.execute('DROP TABLE users')
+    conn.execute('ALTER TABLE users_new RENAME TO users')
+    _create_trial_indexes(conn)
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def _add_presence_timestamps(conn: sqlite3.Connection):
+    _add_column(conn, 'users', 'work_seen_at', 'INTEGER')
+    _add_column(conn, 'users', 'study_seen_at', 'INTEGER')
+
+def _create_trial_page_index(conn: sqlite3.Connection):
+    conn.execute('DROP INDEX IF EXISTS idx_users_trial_deadline')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_trial_page
+        ON users (trial_end_date, telegram_id)
+        WHERE status = 'trial'
+    ''')
+
+def _add_expiry_notification_flag(conn: sqlite3.Connection):
+    _add_column(conn, 'users', 'notified_expired', 'INTEGER DEFAULT 0')
+
+def _create_fsm_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            expires_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fsm_states_expires_at
+        ON fsm_states (expires_at)
+    ''')
+
+def _create_leases_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+def _create_tenants_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tenants (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            work_chat_id INTEGER NOT NULL UNIQUE,
+            study_group_id INTEGER NOT NULL UNIQUE,
+            trial_minutes INTEGER NOT NULL
+        )
+    ''')
+    _add_column(conn, 'users', 'tenant_id', 'INTEGER REFERENCES tenants(id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_tenant ON users (tenant_id)')
+
+def _create_user_search_index(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5(
+            name, username,
+            content='users', content_rowid='telegram_id', tokenize='trigram'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users BEGIN
+            INSERT INTO users_search (rowid, name, username)
+            VALUES (new.telegram_id, new.name, new.username);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users BEGIN
+            INSERT INTO users_search (users_search, rowid, name, username)
+            VALUES ('delete', old.telegram_id, old.name, old.username);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF name, username ON users BEGIN
+            INSERT INTO users_search (users_search, rowid, name, username)
+            VALUES ('delete', old.telegram_id, old.name, old.username);
+            INSERT INTO users_search (rowid, name, username)
+            VALUES (new.telegram_id, new.name, new.username);
+        END
+    ''')
+    conn.execute("INSERT INTO users_search (users_search) VALUES ('rebuild')")
+
+def _create_fsm_version(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO fsm_version (id, version) VALUES (1, 0)')
+
+def _create_user_name_indexes(conn: sqlite3.Connection):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_name ON users (name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE)')
+
+def _create_trial_pending_index(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_trial_pending
+        ON users (trial_end_date)
+        WHERE status = 'trial' AND notified_expired = 0
+    ''')
+
+def _merge_rows(rows: list, new_rows):
+    found = {row['telegram_id'] for row in rows}
+    rows.extend(row for row in new_rows if row['telegram_id'] not in found)
+
+MIGRATIONS = [
+    _create_tables,
+    _create_trial_indexes,
+    _convert_dates_to_epoch,
+    _add_presence_timestamps,
+    _create_trial_page_index,
+    _add_expiry_notification_flag,
+    _create_fsm_table,
+    _create_leases_table,
+    _create_tenants_table,
+    _create_user_search_index,
+    _create_fsm_version,
+    _create_user_name_indexes,
+    _create_trial_pending_index,
+]
+
 class Database:
-    def __init__(self, db_path: str = 'bot.db'):
+    def __init__(self, db_path: str = 'bot.db', synchronous: str = 'NORMAL',
+                 cache_size: int = -16000, busy_timeout: int = 5000, cached_statements: int = 256):
         self.db_path = db_path
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._admins = set()
+        self._listeners = []
         self._init_db()
+        self._reload_admins(self._connection())
     
-    @contextmanager
-    def _get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
         conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def _get_connection(self, write: bool = True):
+        conn = self._connection()
+        if not write:
+            yield conn
+            return
         try:
             yield conn
             conn.commit()
-        finally:
+        except BaseException:
+            conn.rollback()
+            raise
+    
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+    
+    def _notify(self, telegram_ids):
+        telegram_ids = list(telegram_ids)
+        if not telegram_ids:
+            return
+        for callback in self._listeners:
+            callback(telegram_ids)
+    
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
             conn.close()
+        self._local = threading.local()
     
     def _init_db(self):
-        with self._get_connection() as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    telegram_id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    username TEXT,
-                    join_date TEXT NOT NULL,
-                    trial_end_date TEXT NOT NULL,
-                    status TEXT DEFAULT 'trial',
-                    in_work_chat INTEGER DEFAULT 1,
-                    in_study_group INTEGER DEFAULT 1,
-                    notified_one_day INTEGER DEFAULT 0
-                )
-            ''')
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS admins (
-                    telegram_id INTEGER PRIMARY KEY
-                )
-            ''')
+        conn = self._connection()
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    conn.rollback()
+                    return
+                MIGRATIONS[version](conn)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
     
-    def add_user(self, telegram_id: int, name: str, username: Optional[str], trial_minutes: int):
-        join_date = datetime.now()
-        trial_end = join_date + timedelta(minutes=trial_minutes)
+    def add_user(self, telegram_id: int, name: str, username: Optional[str], trial_minutes: int,
+                 tenant_id: Optional[int] = None):
+        join_date = int(time.time())
+        trial_end = join_date + trial_minutes * 60
         
         with self._get_connection() as conn:
-            conn.execute('''
+            cursor = conn.execute('''
                 INSERT OR IGNORE INTO users 
-                (telegram_id, name, username, join_date, trial_end_date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (telegram_id, name, username, join_date.isoformat(), trial_end.isoformat()))
+                (telegram_id, name, username, join_date, trial_end_date, tenant_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (telegram_id, name, username, join_date, trial_end, tenant_id))
+        if cursor.rowcount:
+            self._notify([telegram_id])
     
-    def get_user(self, telegram_id: int):
+    def ingest_joins(self, records):
+        now = int(time.time())
+        presence = []
         with self._get_connection() as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO users
+                (telegram_id, name, username, join_date, trial_end_date, tenant_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (r.telegram_id, r.name, r.username, int(r.joined_at),
+                 int(r.joined_at) + r.trial_minutes * 60, r.tenant_id)
+                for r in records
+            ])
+            for r in records:
+                in_work = None if r.in_work is None else int(r.in_work)
+                in_study = None if r.in_study is None else int(r.in_study)
+                if in_work is not None or in_study is not None:
+                    presence.append((in_work, in_work, now, in_study, in_study, now, r.telegram_id, r.tenant_id))
+            conn.executemany(UPDATE_TENANT_PRESENCE_SQL, presence)
+        self._notify({r.telegram_id for r in records})
+    
+    def get_user(self, telegram_id: int):
+        with self._get_connection(write=False) as conn:
             cursor = conn.execute(
                 'SELECT * FROM users WHERE telegram_id = ?',
                 (telegram_id,)
@@ -59,83 +345,370 @@ class Database:
             return cursor.fetchone()
     
     def get_all_users(self) -> List[sqlite3.Row]:
-        with self._get_connection() as conn:
+        with self._get_connection(write=False) as conn:
             cursor = conn.execute('SELECT * FROM users ORDER BY join_date DESC')
             return cursor.fetchall()
     
-    def get_trial_users(self) -> List[sqlite3.Row]:
-        with self._get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT * FROM users WHERE status = 'trial' ORDER BY trial_end_date"
-            )
-            return cursor.fetchall()
+    def iter_users(self, status: Optional[str] = None, joined_from: Optional[int] = None,
+                   joined_to: Optional[int] = None, batch_size: int = 500):
+        conditions = []
+        params = []
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        if joined_from is not None:
+            conditions.append('join_date >= ?')
+            params.append(joined_from)
+        if joined_to is not None:
+            conditions.append('join_date < ?')
+            params.append(joined_to)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        with self._get_connection(write=False) as conn:
+            cursor = conn.execute(f'SELECT * FROM users {where} ORDER BY join_date DESC', params)
+            try:
+                while rows := cursor.fetchmany(batch_size):
+                    yield from rows
+            finally:
+                cursor.close()
     
-    def get_expired_trials(self) -> List[sqlite3.Row]:
-        now = datetime.now().isoformat()
-        with self._get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT * FROM users WHERE status = 'trial' AND trial_end_date <= ?",
-                (now,)
-            )
+    def get_pending_trials(self, trial_end_before: int) -> List[sqlite3.Row]:
+        with self._get_connection(write=False) as conn:
+            cursor = conn.execute('''
+                SELECT * FROM users
+                WHERE status = 'trial' AND notified_expired = 0 AND trial_end_date < ?
+                ORDER BY trial_end_date
+            ''', (trial_end_before,))
             return cursor.fetchall()
     
-    def get_users_expiring_soon(self, hours: int = 24) -> List[sqlite3.Row]:
-        now = datetime.now()
-        threshold = now + timedelta(hours=hours)
-        
+    def count_trial_users(self) -> int:
+        with self._get_connection(write=False) as conn:
+            cursor = conn.execute("SELECT COUNT(*) FROM users WHERE status = 'trial'")
+            return cursor.fetchone()[0]
+    
+    def get_trial_page(self, after: Optional[tuple] = None, before: Optional[tuple] = None,
+                       limit: int = 10):
+        with self._get_connection(write=False) as conn:
+            if before is not None:
+                cursor = conn.execute(
+                    """SELECT * FROM users
+                       WHERE status = 'trial' AND (trial_end_date, telegram_id) < (?, ?)
+                       ORDER BY trial_end_date DESC, telegram_id DESC
+                       LIMIT ?""",
+                    (*before, limit + 1)
+                )
+                rows = cursor.fetchall()
+                has_prev = len(rows) > limit
+                return list(reversed(rows[:limit])), has_prev, True
+            
+            if after is not None:
+                cursor = conn.execute(
+                    """SELECT * FROM users
+                       WHERE status = 'trial' AND (trial_end_date, telegram_id) > (?, ?)
+                       ORDER BY trial_end_date, telegram_id
+                       LIMIT ?""",
+                    (*after, limit + 1)
+                )
+            else:
+                cursor = conn.execute(
+                    """SELECT * FROM users
+                       WHERE status = 'trial'
+                       ORDER BY trial_end_date, telegram_id
+                       LIMIT ?""",
+                    (limit + 1,)
+                )
+            rows = cursor.fetchall()
+            return rows[:limit], after is not None, len(rows) > limit
+    
+    def get_users(self, telegram_ids) -> List[sqlite3.Row]:
+        telegram_ids = list(telegram_ids)
+        rows = []
+        with self._get_connection(write=False) as conn:
+            for start in range(0, len(telegram_ids), 500):
+                chunk = telegram_ids[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                cursor = conn.execute(
+                    f'SELECT * FROM users WHERE telegram_id IN ({placeholders})',
+                    chunk
+                )
+                rows.extend(cursor.fetchall())
+        return rows
+    
+    def search_users(self, query: str, limit: int = 10) -> List[sqlite3.Row]:
+        query = query.strip().lstrip('@')
+        rows = []
+        with self._get_connection(write=False) as conn:
+            if query.isdigit() and len(query) <= MAX_ID_DIGITS:
+                prefix = int(query)
+                for extra in range(MAX_ID_DIGITS - len(query) + 1):
+                    if len(rows) >= limit:
+                        break
+                    cursor = conn.execute(
+                        'SELECT * FROM users WHERE telegram_id >= ? AND telegram_id < ? ORDER BY telegram_id LIMIT ?',
+                        (prefix * 10 ** extra, (prefix + 1) * 10 ** extra, limit - len(rows))
+                    )
+                    rows.extend(cursor.fetchall())
+            
+            if len(query) < 3:
+                return rows[:limit]
+            
+            for prefix in dict.fromkeys((query[:1].upper() + query[1:], query)):
+                if len(rows) >= limit:
+                    break
+                cursor = conn.execute(
+                    'SELECT * FROM users WHERE name >= ? AND name < ? ORDER BY name LIMIT ?',
+                    (prefix, prefix + MAX_CHAR, limit)
+                )
+                _merge_rows(rows, cursor.fetchall())
+            
+            if len(rows) < limit:
+                cursor = conn.execute('''
+                    SELECT * FROM users
+                    WHERE username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE
+                    ORDER BY username COLLATE NOCASE
+                    LIMIT ?
+                ''', (query, query + MAX_CHAR, limit))
+                _merge_rows(rows, cursor.fetchall())
+            
+            if len(rows) < limit:
+                phrase = '"' + query.replace('"', '""') + '"'
+                cursor = conn.execute('''
+                    SELECT users.* FROM (
+                        SELECT rowid, rank FROM users_search
+                        WHERE users_search MATCH ?
+                        LIMIT ?
+                    ) AS matches
+                    JOIN users ON users.telegram_id = matches.rowid
+                    ORDER BY matches.rank
+                    LIMIT ?
+                ''', (phrase, SEARCH_CANDIDATES, limit + len(rows)))
+                _merge_rows(rows, cursor.fetchall())
+        return rows[:limit]
+    
+    def mark_notified_many(self, telegram_ids):
         with self._get_connection() as conn:
-            cursor = conn.execute(
-                """SELECT * FROM users 
-                   WHERE status = 'trial' 
-                   AND trial_end_date <= ? 
-                   AND trial_end_date > ?
-                   AND notified_one_day = 0""",
-                (threshold.isoformat(), now.isoformat())
+            conn.executemany(
+                'UPDATE users SET notified_one_day = 1 WHERE telegram_id = ?',
+                [(telegram_id,) for telegram_id in telegram_ids]
             )
-            return cursor.fetchall()
     
-    def mark_notified(self, telegram_id: int):
+    def mark_expired_notified(self, telegram_ids):
         with self._get_connection() as conn:
-            conn.execute(
-                'UPDATE users SET notified_one_day = 1 WHERE telegram_id = ?',
-                (telegram_id,)
+            conn.executemany(
+                'UPDATE users SET notified_expired = 1 WHERE telegram_id = ?',
+                [(telegram_id,) for telegram_id in telegram_ids]
             )
     
     def update_status(self, telegram_id: int, status: str):
+        self.update_status_many([telegram_id], status)
+    
+    def update_status_many(self, telegram_ids, status: str):
+        telegram_ids = list(telegram_ids)
         with self._get_connection() as conn:
-            conn.execute(
+            conn.executemany(
                 'UPDATE users SET status = ? WHERE telegram_id = ?',
-                (status, telegram_id)
+                [(status, telegram_id) for telegram_id in telegram_ids]
             )
+        self._notify(telegram_ids)
     
-    def update_presence(self, telegram_id: int, in_work: bool, in_study: bool):
+    def update_presence(self, telegram_id: int, in_work: Optional[bool] = None,
+                        in_study: Optional[bool] = None):
+        self.update_presence_many([(telegram_id, in_work, in_study)])
+    
+    def update_presence_many(self, rows):
+        now = int(time.time())
+        params = []
+        for telegram_id, in_work, in_study in rows:
+            in_work = None if in_work is None else int(in_work)
+            in_study = None if in_study is None else int(in_study)
+            params.append((in_work, in_work, now, in_study, in_study, now, telegram_id))
+        
         with self._get_connection() as conn:
-            conn.execute(
-                'UPDATE users SET in_work_chat = ?, in_study_group = ? WHERE telegram_id = ?',
-                (int(in_work), int(in_study), telegram_id)
+            conn.executemany(UPDATE_PRESENCE_SQL, params)
+    
+    def remove_users(self, telegram_ids):
+        telegram_ids = list(telegram_ids)
+        with self._get_connection() as conn:
+            conn.executemany(
+                'DELETE FROM users WHERE telegram_id = ?',
+                [(telegram_id,) for telegram_id in telegram_ids]
             )
+        self._notify(telegram_ids)
     
     def remove_user(self, telegram_id: int):
         with self._get_connection() as conn:
             conn.execute('DELETE FROM users WHERE telegram_id = ?', (telegram_id,))
+        self._notify([telegram_id])
+    
+    def get_fsm_version(self) -> int:
+        with self._get_connection(write=False) as conn:
+            return conn.execute('SELECT version FROM fsm_version').fetchone()[0]
+    
+    def get_fsm_records(self, limit: int) -> Tuple[int, List[sqlite3.Row]]:
+        version = self.get_fsm_version()
+        with self._get_connection(write=False) as conn:
+            cursor = conn.execute('''
+                SELECT * FROM (
+                    SELECT key, state, data, expires_at FROM fsm_states
+                    WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?
+                ) ORDER BY expires_at
+            ''', (int(time.time()), limit))
+            return version, cursor.fetchall()
+    
+    def set_fsm_record(self, key: str, state: Optional[str], data: str, ttl: int, max_records: int) -> int:
+        now = int(time.time())
+        with self._get_connection() as conn:
+            version = conn.execute(
+                'UPDATE fsm_version SET version = version + 1 RETURNING version'
+            ).fetchone()[0]
+            if state is None and data == '{}':
+                conn.execute('DELETE FROM fsm_states WHERE key = ?', (key,))
+                return version
+            conn.execute('''
+                INSERT INTO fsm_states (key, state, data, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state = excluded.state, data = excluded.data, expires_at = excluded.expires_at
+            ''', (key, state, data, now + ttl))
+            conn.execute('DELETE FROM fsm_states WHERE expires_at <= ?', (now,))
+            conn.execute('''
+                DELETE FROM fsm_states WHERE key IN (
+                    SELECT key FROM fsm_states ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (max_records,))
+            return version
+    
+    def get_tenants(self) -> List[sqlite3.Row]:
+        with self._get_connection(write=False) as conn:
+            cursor = conn.execute('SELECT * FROM tenants ORDER BY id')
+            return cursor.fetchall()
+    
+    def add_tenant(self, name: str, work_chat_id: int, study_group_id: int, trial_minutes: int) -> int:
+        with self._get_connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO tenants (name, work_chat_id, study_group_id, trial_minutes)
+                VALUES (?, ?, ?, ?)
+            ''', (name, work_chat_id, study_group_id, trial_minutes))
+            return cursor.lastrowid
+    
+    def ensure_default_tenant(self, work_chat_id: int, study_group_id: int, trial_minutes: int) -> int:
+        with self._get_connection() as conn:
+            conn.execute('''
+                INSERT INTO tenants (name, work_chat_id, study_group_id, trial_minutes)
+                VALUES ('default', ?, ?, ?)
+                ON CONFLICT(work_chat_id) DO UPDATE SET
+                    study_group_id = excluded.study_group_id,
+                    trial_minutes = excluded.trial_minutes
+            ''', (work_chat_id, study_group_id, trial_minutes))
+            tenant_id = conn.execute(
+                'SELECT id FROM tenants WHERE work_chat_id = ?', (work_chat_id,)
+            ).fetchone()[0]
+            conn.execute('UPDATE users SET tenant_id = ? WHERE tenant_id IS NULL', (tenant_id,))
+            return tenant_id
+    
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        now = time.time()
+        with self._get_connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+            ''', (name, holder, now + ttl, now))
+            return cursor.rowcount > 0
+    
+    def release_lease(self, name: str, holder: str):
+        with self._get_connection() as conn:
+            conn.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (name, holder))
+    
+    def _reload_admins(self, conn: sqlite3.Connection):
+        self._local.data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        cursor = conn.execute('SELECT telegram_id FROM admins')
+        self._admins = {row['telegram_id'] for row in cursor.fetchall()}
+    
+    def refresh_admins(self) -> set:
+        with self._get_connection(write=False) as conn:
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if version != getattr(self._local, 'data_version', None):
+                self._reload_admins(conn)
+        return self._admins
     
     def add_admin(self, telegram_id: int):
         with self._get_connection() as conn:
             conn.execute('INSERT OR IGNORE INTO admins (telegram_id) VALUES (?)', (telegram_id,))
+        self._admins = self._admins | {telegram_id}
     
     def remove_admin(self, telegram_id: int):
         with self._get_connection() as conn:
             conn.execute('DELETE FROM admins WHERE telegram_id = ?', (telegram_id,))
+        self._admins = self._admins - {telegram_id}
     
     def get_all_admins(self) -> List[int]:
-        with self._get_connection() as conn:
-            cursor = conn.execute('SELECT telegram_id FROM admins')
-            return [row['telegram_id'] for row in cursor.fetchall()]
+        return sorted(self.refresh_admins())
     
     def is_admin(self, telegram_id: int) -> bool:
-        with self._get_connection() as conn:
-            cursor = conn.execute(
-                'SELECT telegram_id FROM admins WHERE telegram_id = ?',
-                (telegram_id,)
-            )
-            return cursor.fetchone() is not None
\ No newline at end of file
+        return telegram_id in self.refresh_admins()
+
+class AsyncDatabase:
+    def __init__(self, db: Database):
+        self.sync = db
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+        self._reader = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix='database-reader')
+        self._admin_watcher = None
+    
+    def start(self):
+        if self._admin_watcher is None:
+            self._admin_watcher = asyncio.create_task(self._watch_admins())
+    
+    async def _watch_admins(self):
+        while True:
+            await asyncio.sleep(ADMIN_REFRESH_SECONDS)
+            try:
+                await self.read(self.sync.refresh_admins)
+            except Exception:
+                logging.exception("Не удалось обновить список администраторов")
+    
+    def is_admin(self, telegram_id: int) -> bool:
+        return telegram_id in self.sync._admins
+    
+    def get_all_admins(self) -> List[int]:
+        return sorted(self.sync._admins)
+    
+    async def run(self, func, *args, **kwargs):
+        return await self._run(self._executor, func, *args, **kwargs)
+    
+    async def read(self, func, *args, **kwargs):
+        return await self._run(self._reader, func, *args, **kwargs)
+    
+    async def _run(self, executor: ThreadPoolExecutor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        name = getattr(func, '__name__', type(func).__name__)
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+        except Exception:
+            DB_ERRORS.inc(method=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_SECONDS.observe(elapsed, method=name)
+            add_span('db', name, elapsed)
+    
+    def __getattr__(self, name: str):
+        attr = getattr(self.sync, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+        
+        method.__name__ = name
+        setattr(self, name, method)
+        return method
+    
+    def close(self):
+        if self._admin_watcher:
+            self._admin_watcher.cancel()
+            self._admin_watcher = None
+        self._reader.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        self.sync.close()
\ No newline at end of file
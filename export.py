@@ -0,0 +1,113 @@
+import csv
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from aiogram.types import InputFile
+
+from database import AsyncDatabase, Database
+from utils import format_user_list_item, minutes_remaining
+
+EXPORT_FORMATS = ('txt', 'csv', 'tsv')
+EXPORT_STATUSES = ('all', 'trial', 'approved')
+SPOOL_MAX_SIZE = 1024 * 1024
+
+CSV_HEADER = ['telegram_id', 'username', 'name', 'status', 'join_date', 'trial_end_date', 'minutes_remaining']
+
+class SpooledInputFile(InputFile):
+    def __init__(self, file, filename: str, chunk_size: int = 65536):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+    
+    async def read(self, bot):
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+    
+    def close(self):
+        self.file.close()
+
+class _Utf8Writer:
+    def __init__(self, file):
+        self.file = file
+    
+    def write(self, text: str):
+        self.file.write(text.encode('utf-8'))
+
+def parse_date(value: str) -> int:
+    return int(datetime.strptime(value, '%Y-%m-%d').timestamp())
+
+def _format_timestamp(value: int) -> str:
+    return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M')
+
+def _write_txt(out, users, now: float) -> int:
+    count = 0
+    for user in users:
+        out.write(f"{format_user_list_item(user, now=now)}\n")
+        out.write("-" * 50 + "\n")
+        count += 1
+    return count
+
+def _write_csv(out, users, now: float) -> int:
+    writer = csv.writer(out)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for user in users:
+        writer.writerow([
+            user['telegram_id'],
+            user['username'] or '',
+            user['name'],
+            user['status'],
+            _format_timestamp(user['join_date']),
+            _format_timestamp(user['trial_end_date']),
+            minutes_remaining(user['trial_end_date'], now) if user['status'] == 'trial' else '',
+        ])
+        count += 1
+    return count
+
+def _write_tsv(out, users, now: float) -> int:
+    count = 0
+    for user in users:
+        name = user['name'].replace('\t', ' ').replace('\n', ' ')
+        out.write(f"{user['telegram_id']}\t{user['username'] or ''}\t{name}\t"
+                  f"{user['status']}\t{user['trial_end_date']}\n")
+        count += 1
+    return count
+
+WRITERS = {
+    'txt': _write_txt,
+    'csv': _write_csv,
+    'tsv': _write_tsv,
+}
+
+def write_users_export(db: Database, fmt: str, status: Optional[str] = None,
+                       joined_from: Optional[int] = None, joined_to: Optional[int] = None):
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        users = db.iter_users(status=status, joined_from=joined_from, joined_to=joined_to)
+        count = WRITERS[fmt](_Utf8Writer(spooled), users, time.time())
+    except BaseException:
+        spooled.close()
+        raise
+    return spooled, count
+
+async def build_users_export(db: AsyncDatabase, fmt: str = 'txt', status: str = 'all',
+                             date_from: Optional[str] = None, date_to: Optional[str] = None):
+    joined_from = parse_date(date_from) if date_from else None
+    joined_to = None
+    if date_to:
+        joined_to = int((datetime.fromtimestamp(parse_date(date_to)) + timedelta(days=1)).timestamp())
+    
+    spooled, count = await db.read(
+        write_users_export,
+        db.sync,
+        fmt,
+        status=None if status == 'all' else status,
+        joined_from=joined_from,
+        joined_to=joined_to
+    )
+    if not count:
+        spooled.close()
+        return None, 0
+    return SpooledInputFile(spooled, filename=f"users.{fmt}"), count
@@ -1,52 +1,90 @@
+import csv
+import io
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
 from aiogram import Router, F
-from aiogram.types import Message
-from aiogram.enums import ChatMemberStatus
+from aiogram.types import BufferedInputFile, Message
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
 
-from database import Database
-from config import Config
+from database import AsyncDatabase
+from keyboards import MAIN_MENU_BUTTONS, get_search_keyboard
+from members import remove_member, remove_members
+from tenants import TenantRegistry
+from utils import format_user_page
+from .menu_handlers import MAX_MESSAGE_LENGTH
 
 router = Router()
 
-user_modes = {}
+SEARCH_LIMIT = 10
+MAX_BULK_IDS = 5000
+MAX_ID_FILE_SIZE = 1024 * 1024
+ID_SEPARATORS = re.compile(r'[\s,;]+')
+
+TENANT_USAGE = (
+    "Использование: /tenant_add WORK_CHAT_ID STUDY_GROUP_ID [МИНУТЫ] [название]\n"
+    "Пример: /tenant_add -1001234567890 -1009876543210 11520 Поток 5"
+)
+
+class AdminInput(StatesGroup):
+    delete_user = State()
+    skip_trial = State()
+    add_admin = State()
+    remove_admin = State()
+    search = State()
 
 @router.message(F.text == "Удалить участника")
-async def delete_user_prompt(message: Message, db: Database):
+async def delete_user_prompt(message: Message, db: AsyncDatabase, state: FSMContext):
     if not db.is_admin(message.from_user.id):
         await message.answer("У вас нет прав администратора")
         return
     
-    user_modes[message.from_user.id] = "delete_user"
-    await message.answer("Введите Telegram ID пользователя для удаления:")
+    await state.set_state(AdminInput.delete_user)
+    await message.answer("Введите Telegram ID пользователя для удаления "
+                         "(можно несколько через пробел или файлом .txt/.csv):")
 
 @router.message(F.text == "Skip пробный период")
-async def skip_trial_prompt(message: Message, db: Database):
+async def skip_trial_prompt(message: Message, db: AsyncDatabase, state: FSMContext):
     if not db.is_admin(message.from_user.id):
         await message.answer("У вас нет прав администратора")
         return
     
-    user_modes[message.from_user.id] = "skip_trial"
-    await message.answer("Введите Telegram ID пользователя для перехода в 'Оставлен':")
+    await state.set_state(AdminInput.skip_trial)
+    await message.answer("Введите Telegram ID пользователя для перехода в 'Оставлен' "
+                         "(можно несколько через пробел или файлом .txt/.csv):")
 
 @router.message(F.text == "Добавить администратора")
-async def add_admin_prompt(message: Message, db: Database):
+async def add_admin_prompt(message: Message, db: AsyncDatabase, state: FSMContext):
     if not db.is_admin(message.from_user.id):
         await message.answer("У вас нет прав администратора")
         return
     
-    user_modes[message.from_user.id] = "add_admin"
+    await state.set_state(AdminInput.add_admin)
     await message.answer("Введите Telegram ID пользователя для добавления в администраторы:")
 
 @router.message(F.text == "Убрать администратора")
-async def remove_admin_prompt(message: Message, db: Database):
+async def remove_admin_prompt(message: Message, db: AsyncDatabase, state: FSMContext):
     if not db.is_admin(message.from_user.id):
         await message.answer("У вас нет прав администратора")
         return
     
-    user_modes[message.from_user.id] = "remove_admin"
+    await state.set_state(AdminInput.remove_admin)
     await message.answer("Введите Telegram ID администратора для удаления:")
 
+@router.message(F.text == "Поиск")
+async def search_prompt(message: Message, db: AsyncDatabase, state: FSMContext):
+    if not db.is_admin(message.from_user.id):
+        await message.answer("У вас нет прав администратора")
+        return
+    
+    await state.set_state(AdminInput.search)
+    await message.answer("Введите имя, тег или начало Telegram ID (минимум 3 символа для имени и тега):")
+
 @router.message(F.text == "Список администраторов")
-async def show_admins(message: Message, db: Database):
+async def show_admins(message: Message, db: AsyncDatabase):
     if not db.is_admin(message.from_user.id):
         await message.answer("У вас нет прав администратора")
         return
@@ -63,69 +101,196 @@ async def show_admins(message: Message, db: Database):
     
     await message.answer(text)
 
-@router.message(F.text.regexp(r'^\d+$'))
-async def handle_user_input(message: Message, db: Database, config: Config):
-    user_id = message.from_user.id
-    mode = user_modes.get(user_id)
+@router.message(Command("tenants"))
+async def show_tenants(message: Message, db: AsyncDatabase, tenants: TenantRegistry):
+    if not db.is_admin(message.from_user.id):
+        await message.answer("У вас нет прав администратора")
+        return
+    
+    text = "Потоки:\n\n"
+    for tenant in tenants.all:
+        text += (f"{tenant.id}. {tenant.name}\n"
+                 f"Рабочий чат: {tenant.work_chat_id}\n"
+                 f"Обучающая группа: {tenant.study_group_id}\n"
+                 f"Пробный период: {tenant.trial_minutes} мин\n\n")
     
-    if not mode:
+    await message.answer(text)
+
+@router.message(Command("tenant_add"))
+async def add_tenant(message: Message, command: CommandObject, db: AsyncDatabase, tenants: TenantRegistry):
+    if not db.is_admin(message.from_user.id):
+        await message.answer("У вас нет прав администратора")
+        return
+    
+    args = (command.args or "").split(maxsplit=3)
+    try:
+        work_chat_id = int(args[0])
+        study_group_id = int(args[1])
+        trial_minutes = int(args[2]) if len(args) > 2 else tenants.default.trial_minutes
+    except (IndexError, ValueError):
+        await message.answer(TENANT_USAGE)
         return
+    if trial_minutes <= 0:
+        await message.answer(TENANT_USAGE)
+        return
+    name = args[3] if len(args) > 3 else f"Поток {work_chat_id}"
+    
+    try:
+        tenant = await tenants.add(name, work_chat_id, study_group_id, trial_minutes)
+    except sqlite3.IntegrityError:
+        await message.answer("Один из чатов уже привязан к другому потоку")
+        return
+    
+    await message.answer(f"Поток {tenant.name} добавлен (ID {tenant.id})")
+
+@router.message(
+    StateFilter(AdminInput.search),
+    F.text,
+    ~F.text.startswith("/"),
+    ~F.text.in_(MAIN_MENU_BUTTONS)
+)
+async def search_users(message: Message, db: AsyncDatabase, state: FSMContext):
+    await state.clear()
+    users = await db.search_users(message.text, limit=SEARCH_LIMIT)
     
+    if not users:
+        await message.answer("Ничего не найдено")
+        return
+    
+    await message.answer(
+        f"Найдено: {len(users)}\n\n{format_user_page(users, show_time=True)}",
+        reply_markup=get_search_keyboard(users)
+    )
+
+@router.message(StateFilter(AdminInput), F.text.regexp(r'^\d+$'))
+async def handle_user_input(message: Message, db: AsyncDatabase, tenants: TenantRegistry, state: FSMContext):
+    mode = await state.get_state()
     target_id = int(message.text)
     
-    if mode == "delete_user":
-        user = db.get_user(target_id)
+    if mode == AdminInput.delete_user.state:
+        user = await db.get_user(target_id)
         
         if not user:
             await message.answer("Пользователь не найден")
         else:
-            try:
-                try:
-                    work_member = await message.bot.get_chat_member(config.work_chat_id, target_id)
-                    in_work = work_member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
-                except:
-                    in_work = False
-                
-                try:
-                    study_member = await message.bot.get_chat_member(config.study_group_id, target_id)
-                    in_study = study_member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
-                except:
-                    in_study = False
-                
-                if in_work:
-                    try:
-                        await message.bot.ban_chat_member(config.work_chat_id, target_id)
-                        await message.bot.unban_chat_member(config.work_chat_id, target_id)
-                    except:
-                        pass
-                
-                if in_study:
-                    try:
-                        await message.bot.ban_chat_member(config.study_group_id, target_id)
-                        await message.bot.unban_chat_member(config.study_group_id, target_id)
-                    except:
-                        pass
-                
-                db.remove_user(target_id)
-                await message.answer(f"Пользователь {user['name']} удален")
-            except Exception as e:
-                await message.answer(f"Ошибка: {str(e)}")
-    
-    elif mode == "skip_trial":
-        user = db.get_user(target_id)
+            result = await remove_member(message.bot, target_id, tenants.chats_for(user))
+            await db.remove_user(target_id)
+            
+            text = f"Пользователь {user['name']} удален"
+            if not result.ok:
+                text += "\n\nОшибки: " + "; ".join(result.errors)
+            await message.answer(text)
+    
+    elif mode == AdminInput.skip_trial.state:
+        user = await db.get_user(target_id)
         
         if not user:
             await message.answer("Пользователь не найден")
         else:
-            db.update_status(target_id, "approved")
+            await db.update_status(target_id, "approved")
             await message.answer(f"Пользователь {user['name']} переведен в 'Оставлен'")
     
-    elif mode == "add_admin":
-        db.add_admin(target_id)
+    elif mode == AdminInput.add_admin.state:
+        await db.add_admin(target_id)
         await message.answer(f"Пользователь с ID {target_id} теперь администратор")
     
-    elif mode == "remove_admin":
-        db.remove_admin(target_id)
+    elif mode == AdminInput.remove_admin.state:
+        await db.remove_admin(target_id)
         await message.answer(f"Пользователь с ID {target_id} больше не администратор")
     
-    user_modes[user_id] = None
+    await state.clear()
+
+def _parse_ids(tokens) -> Tuple[List[int], List[str]]:
+    ids = []
+    invalid = []
+    seen = set()
+    for token in tokens:
+        token = token.strip()
+        if not token:
+            continue
+        if not token.isdigit():
+            invalid.append(token)
+        elif int(token) not in seen:
+            seen.add(int(token))
+            ids.append(int(token))
+    return ids, invalid
+
+async def _read_id_tokens(message: Message) -> Optional[List[str]]:
+    if message.text:
+        return ID_SEPARATORS.split(message.text)
+    
+    document = message.document
+    filename = (document.file_name or "").lower()
+    if not filename.endswith((".txt", ".csv")) or (document.file_size or 0) > MAX_ID_FILE_SIZE:
+        return None
+    
+    content = (await message.bot.download(document)).read().decode("utf-8-sig", errors="replace")
+    if filename.endswith(".csv"):
+        cells = [row[0] for row in csv.reader(io.StringIO(content)) if row]
+        if cells and not cells[0].strip().isdigit():
+            cells = cells[1:]
+        return cells
+    return ID_SEPARATORS.split(content)
+
+async def _bulk_delete(message: Message, db: AsyncDatabase, tenants: TenantRegistry, users: dict) -> dict:
+    groups = {}
+    for user in users.values():
+        groups.setdefault(tenants.for_user(user), []).append(user["telegram_id"])
+    
+    outcomes = {}
+    for tenant, user_ids in groups.items():
+        results = await remove_members(message.bot, user_ids, tenant.chat_ids if tenant else [])
+        for result in results:
+            outcomes[result.user_id] = "удален" if result.ok else f"удален, ошибки: {'; '.join(result.errors)}"
+    
+    await db.remove_users(list(users))
+    return outcomes
+
+async def _send_report(message: Message, title: str, lines: List[str]):
+    text = f"{title}\n\n" + "\n".join(lines)
+    if len(text) <= MAX_MESSAGE_LENGTH:
+        await message.answer(text)
+        return
+    
+    await message.answer_document(
+        document=BufferedInputFile(text.encode("utf-8"), filename="report.txt"),
+        caption=title
+    )
+
+@router.message(
+    StateFilter(AdminInput.delete_user, AdminInput.skip_trial),
+    F.text.regexp(r'^[\d\s,;]+$') | F.document
+)
+async def handle_bulk_input(message: Message, db: AsyncDatabase, tenants: TenantRegistry, state: FSMContext):
+    mode = await state.get_state()
+    tokens = await _read_id_tokens(message)
+    if tokens is None:
+        await message.answer("Поддерживаются файлы .txt и .csv размером до 1 МБ")
+        return
+    
+    ids, invalid = _parse_ids(tokens)
+    if not ids:
+        await message.answer("Не найдено ни одного Telegram ID")
+        return
+    if len(ids) > MAX_BULK_IDS:
+        await message.answer(f"Слишком много ID за раз: {len(ids)}, максимум {MAX_BULK_IDS}")
+        return
+    
+    await state.clear()
+    users = {user["telegram_id"]: user for user in await db.get_users(ids)}
+    
+    if mode == AdminInput.delete_user.state:
+        outcomes = await _bulk_delete(message, db, tenants, users)
+        title = f"Удаление: удалено {len(users)} из {len(ids)}"
+    else:
+        await db.update_status_many(list(users), "approved")
+        outcomes = {user_id: "переведен в 'Оставлен'" for user_id in users}
+        title = f"Skip пробного периода: {len(users)} из {len(ids)}"
+    
+    lines = [
+        f"{user_id} | {users[user_id]['name']} | {outcomes[user_id]}" if user_id in users
+        else f"{user_id} | не найден"
+        for user_id in ids
+    ]
+    lines.extend(f"{token} | неверный ID" for token in invalid)
+    await _send_report(message, title, lines)
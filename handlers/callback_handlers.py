@@ -1,61 +1,92 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
-from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramBadRequest
 
-from database import Database
-from config import Config
+from database import AsyncDatabase
+from keyboards import without_user
+from members import remove_member
+from export import EXPORT_FORMATS, EXPORT_STATUSES
+from tenants import TenantRegistry
+from .menu_handlers import render_trial_page, send_users_export
 
 router = Router()
 
+def _decision_note(callback: CallbackQuery, user_id: int, action: str) -> str:
+    markup = callback.message.reply_markup
+    buttons = [button.text for row in markup.inline_keyboard for button in row] if markup else []
+    if any(text not in ("Оставить", "Кикнуть") for text in buttons):
+        return f"ID {user_id}: {action}"
+    return f"Пользователь {action}"
+
 @router.callback_query(F.data.startswith("approve_"))
-async def approve_user(callback: CallbackQuery, db: Database):
+async def approve_user(callback: CallbackQuery, db: AsyncDatabase):
     user_id = int(callback.data.split("_")[1])
-    db.update_status(user_id, "approved")
+    await db.update_status(user_id, "approved")
     
     await callback.message.edit_text(
-        f"{callback.message.text}\n\nПользователь оставлен"
+        f"{callback.message.text}\n\n{_decision_note(callback, user_id, 'оставлен')}",
+        reply_markup=without_user(callback.message.reply_markup, user_id)
     )
     await callback.answer()
 
 @router.callback_query(F.data.startswith("kick_"))
-async def kick_user(callback: CallbackQuery, db: Database, config: Config):
+async def kick_user(callback: CallbackQuery, db: AsyncDatabase, tenants: TenantRegistry):
     user_id = int(callback.data.split("_")[1])
+    user = await db.get_user(user_id)
     
-    try:
-        try:
-            work_member = await callback.bot.get_chat_member(config.work_chat_id, user_id)
-            in_work = work_member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
-        except:
-            in_work = False
-        
-        try:
-            study_member = await callback.bot.get_chat_member(config.study_group_id, user_id)
-            in_study = study_member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
-        except:
-            in_study = False
-        
-        if in_work:
-            try:
-                await callback.bot.ban_chat_member(config.work_chat_id, user_id)
-                await callback.bot.unban_chat_member(config.work_chat_id, user_id)
-            except:
-                pass
-        
-        if in_study:
-            try:
-                await callback.bot.ban_chat_member(config.study_group_id, user_id)
-                await callback.bot.unban_chat_member(config.study_group_id, user_id)
-            except:
-                pass
-        
-        db.remove_user(user_id)
-        
-        await callback.message.edit_text(
-            f"{callback.message.text}\n\nПользователь удален"
-        )
-    except Exception as e:
-        await callback.message.edit_text(
-            f"{callback.message.text}\n\nОшибка: {str(e)}"
-        )
+    result = await remove_member(callback.bot, user_id, tenants.chats_for(user))
+    await db.remove_user(user_id)
+    
+    text = f"{callback.message.text}\n\n{_decision_note(callback, user_id, 'удален')}"
+    if not result.ok:
+        text += "\nОшибки: " + "; ".join(result.errors)
+    await callback.message.edit_text(
+        text,
+        reply_markup=without_user(callback.message.reply_markup, user_id)
+    )
+    
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("delete_"))
+async def delete_user(callback: CallbackQuery, db: AsyncDatabase):
+    user_id = int(callback.data.split("_")[1])
+    await db.remove_user(user_id)
+    
+    await callback.message.edit_text(
+        f"{callback.message.text}\n\n{_decision_note(callback, user_id, 'удален из базы')}",
+        reply_markup=without_user(callback.message.reply_markup, user_id)
+    )
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("export_"))
+async def export_users(callback: CallbackQuery, db: AsyncDatabase):
+    _, fmt, status = callback.data.split("_")
+    
+    if fmt not in EXPORT_FORMATS or status not in EXPORT_STATUSES:
+        await callback.answer()
+        return
     
     await callback.answer()
+    await send_users_export(callback.message, db, fmt, status)
+
+@router.callback_query(F.data.startswith("trialpage_"))
+async def trial_page(callback: CallbackQuery, db: AsyncDatabase):
+    _, direction, page, trial_end, telegram_id = callback.data.split("_")
+    cursor = (int(trial_end), int(telegram_id))
+    
+    if direction == "next":
+        text, keyboard = await render_trial_page(db, int(page), after=cursor)
+    else:
+        text, keyboard = await render_trial_page(db, max(1, int(page)), before=cursor)
+    
+    if not text:
+        text, keyboard = await render_trial_page(db)
+    
+    try:
+        if text:
+            await callback.message.edit_text(text, reply_markup=keyboard)
+        else:
+            await callback.message.edit_text("Нет пользователей на пробном периоде")
+    except TelegramBadRequest:
+        pass
+    await callback.answer()
\ No newline at end of file
@@ -2,79 +2,88 @@ from aiogram import Router
 from aiogram.types import ChatMemberUpdated, ChatJoinRequest
 from aiogram.filters import ChatMemberUpdatedFilter, KICKED, MEMBER, LEFT
 
-from database import Database
-from config import Config
+from database import AsyncDatabase
+from ingest import JoinIngestor, JoinRecord
+from members import remove_member
+from outbox import broadcast
+from tenants import Tenant, TenantRegistry
 from utils import format_username
 
 router = Router()
 
+def _presence_update(chat_id: int, tenant: Tenant, present: bool):
+    if chat_id == tenant.work_chat_id:
+        return present, None
+    if chat_id == tenant.study_group_id:
+        return None, present
+    return None
+
 @router.chat_join_request()
-async def handle_join_request(event: ChatJoinRequest, db: Database, config: Config):
+async def handle_join_request(event: ChatJoinRequest, ingestor: JoinIngestor, tenants: TenantRegistry):
     user = event.from_user
-    chat_id = event.chat.id
+    tenant = await tenants.by_chat(event.chat.id)
+    if not tenant:
+        return
     
     await event.approve()
     
-    if chat_id == config.work_chat_id:
-        if not db.get_user(user.id):
-            db.add_user(
-                telegram_id=user.id,
-                name=user.full_name,
-                username=user.username,
-                trial_minutes=config.trial_minutes
-            )
+    if event.chat.id == tenant.work_chat_id:
+        ingestor.submit(JoinRecord(
+            telegram_id=user.id,
+            name=user.full_name,
+            username=user.username,
+            trial_minutes=tenant.trial_minutes,
+            in_work=True,
+            tenant_id=tenant.id
+        ))
 
 @router.chat_member(ChatMemberUpdatedFilter(member_status_changed=MEMBER))
-async def user_joined(event: ChatMemberUpdated, db: Database, config: Config):
+async def user_joined(event: ChatMemberUpdated, ingestor: JoinIngestor, tenants: TenantRegistry):
     user = event.new_chat_member.user
-    chat_id = event.chat.id
+    tenant = await tenants.by_chat(event.chat.id)
+    if not tenant:
+        return
+    in_work, in_study = _presence_update(event.chat.id, tenant, True)
     
-    if not db.get_user(user.id):
-        db.add_user(
-            telegram_id=user.id,
-            name=user.full_name,
-            username=user.username,
-            trial_minutes=config.trial_minutes
-        )
+    ingestor.submit(JoinRecord(
+        telegram_id=user.id,
+        name=user.full_name,
+        username=user.username,
+        trial_minutes=tenant.trial_minutes,
+        in_work=in_work,
+        in_study=in_study,
+        tenant_id=tenant.id
+    ))
 
 @router.chat_member(ChatMemberUpdatedFilter(member_status_changed=KICKED | LEFT))
-async def user_left(event: ChatMemberUpdated, db: Database, config: Config):
-    user_id = event.from_user.id
-    user_data = db.get_user(user_id)
+async def user_left(event: ChatMemberUpdated, db: AsyncDatabase, ingestor: JoinIngestor,
+                    tenants: TenantRegistry):
+    user_id = event.new_chat_member.user.id
+    if ingestor.is_pending(user_id):
+        await ingestor.flush()
+    user_data = await db.get_user(user_id)
+    
+    tenant = tenants.for_user(user_data) if user_data else None
     
-    if user_data:
+    if tenant:
         chat_id = event.chat.id
-        
-        if chat_id == config.work_chat_id:
-            db.update_presence(user_id, False, user_data['in_study_group'])
-            left_from = "рабочего чата"
-        elif chat_id == config.study_group_id:
-            db.update_presence(user_id, user_data['in_work_chat'], False)
-            left_from = "обучающей группы"
-        else:
+        presence = _presence_update(chat_id, tenant, False)
+        if not presence:
             return
         
+        await db.update_presence(user_id, *presence)
+        left_from = "рабочего чата" if chat_id == tenant.work_chat_id else "обучающей группы"
+        if len(tenants.all) > 1:
+            left_from += f" ({tenant.name})"
+        
         admins = db.get_all_admins()
         text = (f"Пользователь вышел из {left_from}\n\n"
                 f"{user_data['name']}\n"
                 f"ID: {user_data['telegram_id']}\n"
                 f"{format_username(user_data['username'])}")
         
-        for admin_id in admins:
-            try:
-                await event.bot.send_message(admin_id, text)
-            except:
-                continue
+        await broadcast(event.bot, admins, text)
         
-        if chat_id == config.study_group_id:
-            try:
-                await event.bot.ban_chat_member(config.work_chat_id, user_id)
-                await event.bot.unban_chat_member(config.work_chat_id, user_id)
-            except:
-                pass
-            try:
-                await event.bot.ban_chat_member(config.study_group_id, user_id)
-                await event.bot.unban_chat_member(config.study_group_id, user_id)
-            except:
-                pass
-            db.remove_user(user_id)
\ No newline at end of file
+        if chat_id == tenant.study_group_id:
+            await remove_member(event.bot, user_id, tenant.chat_ids, check_membership=False)
+            await db.remove_user(user_id)
\ No newline at end of file
@@ -0,0 +1,34 @@
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import BufferedInputFile, Message
+
+from database import AsyncDatabase
+from tracing import Profiler
+from watchdog import LoopWatchdog
+
+router = Router()
+
+@router.message(F.text == "Профилирование")
+async def toggle_profiling(message: Message, db: AsyncDatabase, profiler: Profiler):
+    if not db.is_admin(message.from_user.id):
+        await message.answer("У вас нет прав администратора")
+        return
+    
+    if not profiler.running:
+        profiler.start()
+        await message.answer("Профилирование запущено. Нажмите кнопку еще раз, чтобы получить отчет")
+        return
+    
+    report = profiler.stop()
+    await message.answer_document(
+        document=BufferedInputFile(report.encode('utf-8'), filename="profile.txt"),
+        caption="Отчет профилировщика"
+    )
+
+@router.message(Command("lag"))
+async def show_loop_lag(message: Message, db: AsyncDatabase, watchdog: LoopWatchdog):
+    if not db.is_admin(message.from_user.id):
+        await message.answer("У вас нет прав администратора")
+        return
+    
+    await message.answer(watchdog.summary())
@@ -1,139 +1,218 @@
-from aiogram import Router, F
-from aiogram.types import Message, BufferedInputFile
-from aiogram.enums import ChatMemberStatus
+import asyncio
+import logging
+import time
 
-from database import Database
+from aiogram import Bot, Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from database import AsyncDatabase
 from config import Config
-from utils import format_user_info, format_username, format_user_list_item
+from export import EXPORT_FORMATS, EXPORT_STATUSES, build_users_export
+from keyboards import get_export_options, get_trial_page_keyboard
+from members import is_chat_member, remove_member
+from tenants import Tenant, TenantRegistry
+from utils import format_user_page, format_username
 
 router = Router()
 
 MAX_MESSAGE_LENGTH = 4000
+TRIAL_PAGE_SIZE = 10
+PRESENCE_CONCURRENCY = 10
+PROGRESS_INTERVAL = 2
 
-@router.message(F.text == "Пользователи")
-async def show_users(message: Message, db: Database):
-    users = db.get_all_users()
+EXPORT_USAGE = (
+    "Использование: /export [txt|csv|tsv] [all|trial|approved] [ГГГГ-ММ-ДД] [ГГГГ-ММ-ДД]\n"
+    "Пример: /export csv trial 2026-01-01 2026-01-31"
+)
+
+async def send_users_export(message: Message, db: AsyncDatabase, fmt: str = "txt",
+                            status: str = "all", date_from: str = None, date_to: str = None):
+    file, count = await build_users_export(db, fmt, status, date_from, date_to)
     
-    if not users:
+    if not file:
         await message.answer("Нет пользователей")
         return
     
-    users_text = ""
-    for user in users:
-        users_text += f"{format_user_list_item(user)}\n"
-        users_text += "-" * 50 + "\n"
+    try:
+        await message.answer_document(
+            document=file,
+            caption=f"Все пользователи ({count})" if status == "all" else f"Пользователи: {status} ({count})",
+            reply_markup=get_export_options()
+        )
+    finally:
+        file.close()
+
+@router.message(F.text == "Пользователи")
+async def show_users(message: Message, db: AsyncDatabase):
+    await send_users_export(message, db)
+
+@router.message(Command("export"))
+async def export_users(message: Message, command: CommandObject, db: AsyncDatabase):
+    if not db.is_admin(message.from_user.id):
+        await message.answer("У вас нет прав администратора")
+        return
     
-    file = BufferedInputFile(
-        users_text.encode("utf-8"),
-        filename="users.txt"
-    )
+    args = (command.args or "").split()
+    fmt = args[0] if len(args) > 0 else "txt"
+    status = args[1] if len(args) > 1 else "all"
+    date_from = args[2] if len(args) > 2 else None
+    date_to = args[3] if len(args) > 3 else None
     
-    await message.answer_document(
-        document=file,
-        caption="Все пользователи"
-    )
+    if fmt not in EXPORT_FORMATS or status not in EXPORT_STATUSES:
+        await message.answer(EXPORT_USAGE)
+        return
+    
+    try:
+        await send_users_export(message, db, fmt, status, date_from, date_to)
+    except ValueError:
+        await message.answer(EXPORT_USAGE)
+
+async def render_trial_page(db: AsyncDatabase, page: int = 1, after: tuple = None, before: tuple = None):
+    users, has_prev, has_next = await db.get_trial_page(after=after, before=before, limit=TRIAL_PAGE_SIZE)
+    if not users:
+        return None, None
+    
+    total = await db.count_trial_users()
+    cards = format_user_page(users, show_time=True)
+    text = f"На пробном периоде ({total}), страница {page}:\n\n{cards}"
+    keyboard = get_trial_page_keyboard(page, users[0], users[-1], has_prev, has_next)
+    return text, keyboard
 
 @router.message(F.text == "На пробном периоде")
-async def show_trial_users(message: Message, db: Database):
-    users = db.get_trial_users()
+async def show_trial_users(message: Message, db: AsyncDatabase):
+    text, keyboard = await render_trial_page(db)
     
-    if not users:
+    if not text:
         await message.answer("Нет пользователей на пробном периоде")
         return
     
-    user_texts = [format_user_info(user, show_time=True) for user in users]
+    await message.answer(text, reply_markup=keyboard)
+
+def _user_line(user) -> str:
+    return f"{user['name']} | ID: {user['telegram_id']} | {format_username(user['username'])}"
+
+def _split_messages(lines, header: str):
+    current = header
+    for line in lines:
+        if len(current) + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            yield current.rstrip()
+            current = ""
+        current += line + "\n"
+    if current.strip():
+        yield current.rstrip()
+
+def _is_stale(seen_at, threshold: int) -> bool:
+    return seen_at is None or seen_at < threshold
+
+async def _check_user(bot: Bot, tenant: Tenant, user, threshold: int, semaphore: asyncio.Semaphore):
+    user_id = user["telegram_id"]
+    check_work = _is_stale(user["work_seen_at"], threshold)
+    check_study = _is_stale(user["study_seen_at"], threshold)
+    in_work = bool(user["in_work_chat"])
+    in_study = bool(user["in_study_group"])
+    
+    if check_work or check_study:
+        async with semaphore:
+            checks = []
+            if check_work:
+                checks.append(is_chat_member(bot, tenant.work_chat_id, user_id))
+            if check_study:
+                checks.append(is_chat_member(bot, tenant.study_group_id, user_id))
+            results = list(await asyncio.gather(*checks))
+            if check_work:
+                in_work = results.pop(0)
+            if check_study:
+                in_study = results.pop(0)
     
-    current_message = "На пробном периоде:\n\n"
-    message_count = 1
+    if in_study and not in_work:
+        removal = await remove_member(bot, user_id, [tenant.study_group_id], check_membership=False)
+        if not removal.ok:
+            raise RuntimeError("; ".join(removal.errors))
     
-    for user_text in user_texts:
-        test_message = current_message + user_text + "\n\n"
-        
-        if len(test_message) > MAX_MESSAGE_LENGTH:
-            await message.answer(current_message.strip())
-            message_count += 1
-            current_message = f"На пробном периоде (часть {message_count}):\n\n{user_text}\n\n"
-        else:
-            current_message = test_message
-    
-    if current_message.strip():
-        await message.answer(current_message.strip())
+    return (
+        in_work if check_work else None,
+        in_study if check_study else None,
+        in_work,
+        in_study,
+    )
 
 @router.message(F.text == "Проверка")
-async def check_presence(message: Message, db: Database, config: Config):
-    from keyboards import get_trial_decision
-    
-    users = db.get_all_users()
-    found_issues = False
+async def check_presence(message: Message, db: AsyncDatabase, config: Config, tenants: TenantRegistry):
+    users = await db.get_all_users()
+    total = len(users)
+    threshold = int(time.time()) - config.presence_max_age_minutes * 60
     
-    await message.answer("Начинаю проверку...")
+    status = await message.answer(f"Начинаю проверку... 0 из {total}")
+    semaphore = asyncio.Semaphore(PRESENCE_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(_check_user(message.bot, tenants.for_user(user), user, threshold, semaphore))
+        for user in users
+    ]
     
-    for user in users:
+    done = 0
+    last_progress = time.monotonic()
+    for completed in asyncio.as_completed(tasks):
         try:
-            work_member = await message.bot.get_chat_member(
-                config.work_chat_id, user["telegram_id"]
-            )
-            study_member = await message.bot.get_chat_member(
-                config.study_group_id, user["telegram_id"]
-            )
-            
-            in_work = work_member.status not in (
-                ChatMemberStatus.LEFT,
-                ChatMemberStatus.KICKED,
-            )
-            in_study = study_member.status not in (
-                ChatMemberStatus.LEFT,
-                ChatMemberStatus.KICKED,
-            )
-            
-            db.update_presence(user["telegram_id"], in_work, in_study)
-            
-            if in_study and not in_work:
-                try:
-                    await message.bot.ban_chat_member(
-                        config.study_group_id, user["telegram_id"]
-                    )
-                    await message.bot.unban_chat_member(
-                        config.study_group_id, user["telegram_id"]
-                    )
-                    
-                    text = (
-                        "Пользователь удален из обучающей группы (нет в рабочем чате)\n\n"
-                        f"{user['name']}\n"
-                        f"ID: {user['telegram_id']}\n"
-                        f"{format_username(user['username'])}"
-                    )
-                    
-                    await message.answer(text)
-                    db.remove_user(user["telegram_id"])
-                    found_issues = True
-                except Exception as e:
-                    await message.answer(
-                        f"Ошибка при удалении {user['telegram_id']}: {e}"
-                    )
-            elif not in_work or not in_study:
-                left_from = []
-                if not in_work:
-                    left_from.append("рабочего чата")
-                if not in_study:
-                    left_from.append("обучающей группы")
-                
-                text = (
-                    f"Пользователь вышел из: {', '.join(left_from)}\n\n"
-                    f"{user['name']}\n"
-                    f"ID: {user['telegram_id']}\n"
-                    f"{format_username(user['username'])}"
-                )
-                
-                keyboard = get_trial_decision(user["telegram_id"])
-                await message.answer(text, reply_markup=keyboard)
-                found_issues = True
-        except Exception as e:
-            print(
-                f"Ошибка при проверке пользователя {user['telegram_id']}: {e}"
-            )
-    
-    if not found_issues:
+            await completed
+        except Exception:
+            pass
+        done += 1
+        if time.monotonic() - last_progress >= PROGRESS_INTERVAL and done < total:
+            last_progress = time.monotonic()
+            try:
+                await status.edit_text(f"Проверка... {done} из {total}")
+            except Exception:
+                pass
+    
+    presence = []
+    removed = []
+    left = []
+    errors = []
+    queried = 0
+    
+    for user, task in zip(users, tasks):
+        if task.exception() is not None:
+            logging.warning("Ошибка при проверке пользователя %s: %s", user["telegram_id"], task.exception())
+            errors.append(f"{_user_line(user)} | {task.exception()}")
+            continue
+        
+        checked_work, checked_study, in_work, in_study = task.result()
+        if checked_work is not None or checked_study is not None:
+            queried += 1
+        if in_study and not in_work:
+            removed.append(user)
+            continue
+        
+        if checked_work is not None or checked_study is not None:
+            presence.append((user["telegram_id"], checked_work, checked_study))
+        if not in_work or not in_study:
+            left_from = []
+            if not in_work:
+                left_from.append("рабочего чата")
+            if not in_study:
+                left_from.append("обучающей группы")
+            left.append(f"{_user_line(user)} | вышел из: {', '.join(left_from)}")
+    
+    await db.update_presence_many(presence)
+    await db.remove_users([user["telegram_id"] for user in removed])
+    
+    await status.edit_text(
+        f"Проверка завершена. Проверено: {total}, "
+        f"запрошено в Telegram: {queried}"
+    )
+    
+    if not removed and not left and not errors:
         await message.answer("Проверка завершена. Все пользователи на месте.")
-    else:
-        await message.answer("Проверка завершена")
+        return
+    
+    sections = [
+        ("Удалены из обучающей группы (нет в рабочем чате)", [_user_line(user) for user in removed]),
+        ("Вышли из чатов", left),
+        ("Ошибки при проверке", errors),
+    ]
+    for title, lines in sections:
+        if not lines:
+            continue
+        for text in _split_messages(lines, f"{title} ({len(lines)}):\n\n"):
+            await message.answer(text)
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from database import AsyncDatabase
+
+FLUSH_SIZE = 200
+FLUSH_INTERVAL = 0.5
+RETRY_SECONDS = 1
+
+@dataclass
+class JoinRecord:
+    telegram_id: int
+    name: str
+    username: Optional[str]
+    trial_minutes: int
+    in_work: Optional[bool] = None
+    in_study: Optional[bool] = None
+    joined_at: float = field(default_factory=time.time)
+    tenant_id: Optional[int] = None
+
+def _resolve(batch: list):
+    for item in batch:
+        if isinstance(item, asyncio.Future) and not item.done():
+            item.set_result(None)
+
+class JoinIngestor:
+    def __init__(self, db: AsyncDatabase, flush_size: int = FLUSH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.db = db
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue()
+        self._pending = {}
+        self._task = None
+    
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+        await self.flush()
+    
+    def submit(self, record: JoinRecord):
+        self._pending[record.telegram_id] = self._pending.get(record.telegram_id, 0) + 1
+        self._queue.put_nowait(record)
+    
+    def is_pending(self, telegram_id: int) -> bool:
+        return telegram_id in self._pending
+    
+    async def flush(self):
+        if self._task is None or self._task.done():
+            batch = self._take(self._queue.qsize())
+            records = [item for item in batch if isinstance(item, JoinRecord)]
+            if records:
+                await self._write(records)
+            _resolve(batch)
+            return
+        
+        done = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(done)
+        await done
+    
+    def _take(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+    
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_size and isinstance(batch[-1], JoinRecord):
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            stopping = batch[-1] is None
+            records = [item for item in batch if isinstance(item, JoinRecord)]
+            
+            while records:
+                try:
+                    await self._write(records)
+                    break
+                except Exception:
+                    logging.exception("Не удалось сохранить %s новых участников", len(records))
+                    if stopping:
+                        break
+                    await asyncio.sleep(RETRY_SECONDS)
+            
+            _resolve(batch)
+            if stopping:
+                return
+    
+    async def _write(self, batch: list):
+        await self.db.ingest_joins(batch)
+        for record in batch:
+            count = self._pending[record.telegram_id] - 1
+            if count:
+                self._pending[record.telegram_id] = count
+            else:
+                del self._pending[record.telegram_id]
@@ -1,18 +1,28 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 
+KEYBOARD_CACHE_SIZE = 1024
+
+MAIN_MENU_BUTTONS = (
+    "Пользователи",
+    "На пробном периоде",
+    "Проверка",
+    "Поиск",
+    "Удалить участника",
+    "Skip пробный период",
+    "Добавить администратора",
+    "Убрать администратора",
+    "Список администраторов",
+    "Профилирование",
+)
+
+@lru_cache(maxsize=1)
 def get_main_menu() -> ReplyKeyboardMarkup:
-    keyboard = [
-        [KeyboardButton(text="Пользователи")],
-        [KeyboardButton(text="На пробном периоде")],
-        [KeyboardButton(text="Проверка")],
-        [KeyboardButton(text="Удалить участника")],
-        [KeyboardButton(text="Skip пробный период")],
-        [KeyboardButton(text="Добавить администратора")],
-        [KeyboardButton(text="Убрать администратора")],
-        [KeyboardButton(text="Список администраторов")]
-    ]
+    keyboard = [[KeyboardButton(text=text)] for text in MAIN_MENU_BUTTONS]
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_trial_decision(telegram_id: int) -> InlineKeyboardMarkup:
     keyboard = [
         [
@@ -20,4 +30,79 @@ def get_trial_decision(telegram_id: int) -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="Кикнуть", callback_data=f"kick_{telegram_id}")
         ]
     ]
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
\ No newline at end of file
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _digest_keyboard(users: tuple) -> InlineKeyboardMarkup:
+    keyboard = []
+    for telegram_id, name in users:
+        keyboard.append([
+            InlineKeyboardButton(text=f"Оставить {name}", callback_data=f"approve_{telegram_id}"),
+            InlineKeyboardButton(text=f"Кикнуть {name}", callback_data=f"kick_{telegram_id}")
+        ])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def get_digest_keyboard(users) -> InlineKeyboardMarkup:
+    return _digest_keyboard(tuple((user['telegram_id'], user['name'][:20]) for user in users))
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _search_keyboard(users: tuple) -> InlineKeyboardMarkup:
+    keyboard = []
+    for telegram_id, name in users:
+        keyboard.append([
+            InlineKeyboardButton(text=f"Оставить {name}", callback_data=f"approve_{telegram_id}"),
+            InlineKeyboardButton(text="Кикнуть", callback_data=f"kick_{telegram_id}"),
+            InlineKeyboardButton(text="Удалить из базы", callback_data=f"delete_{telegram_id}")
+        ])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def get_search_keyboard(users) -> InlineKeyboardMarkup:
+    return _search_keyboard(tuple((user['telegram_id'], user['name'][:15]) for user in users))
+
+def without_user(markup: InlineKeyboardMarkup, telegram_id: int):
+    if markup is None:
+        return None
+    suffix = f"_{telegram_id}"
+    keyboard = [
+        row for row in markup.inline_keyboard
+        if not any((button.callback_data or '').endswith(suffix) for button in row)
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard) if keyboard else None
+
+@lru_cache(maxsize=1)
+def get_export_options() -> InlineKeyboardMarkup:
+    keyboard = [
+        [
+            InlineKeyboardButton(text="CSV", callback_data="export_csv_all"),
+            InlineKeyboardButton(text="TSV", callback_data="export_tsv_all")
+        ],
+        [
+            InlineKeyboardButton(text="Пробный (CSV)", callback_data="export_csv_trial"),
+            InlineKeyboardButton(text="Оставлен (CSV)", callback_data="export_csv_approved")
+        ]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _trial_page_keyboard(page: int, first: tuple, last: tuple, has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    row = []
+    if has_prev:
+        row.append(InlineKeyboardButton(
+            text="◀",
+            callback_data=f"trialpage_prev_{page - 1}_{first[0]}_{first[1]}"
+        ))
+    if has_next:
+        row.append(InlineKeyboardButton(
+            text="▶",
+            callback_data=f"trialpage_next_{page + 1}_{last[0]}_{last[1]}"
+        ))
+    return InlineKeyboardMarkup(inline_keyboard=[row] if row else [])
+
+def get_trial_page_keyboard(page: int, first, last, has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    return _trial_page_keyboard(
+        page,
+        (first['trial_end_date'], first['telegram_id']),
+        (last['trial_end_date'], last['telegram_id']),
+        has_prev,
+        has_next
+    )
\ No newline at end of file
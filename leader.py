@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+from database import AsyncDatabase
+
+LEASE_TTL_SECONDS = 15
+
+class LeaderLease:
+    def __init__(self, db: AsyncDatabase, on_elected, on_demoted, name: str = 'scheduler',
+                 ttl: float = LEASE_TTL_SECONDS):
+        self.db = db
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._task = None
+    
+    async def start(self):
+        await self._heartbeat()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            self._set_leader(False)
+            await self.db.release_lease(self.name, self.holder)
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await self._heartbeat()
+    
+    async def _heartbeat(self):
+        try:
+            acquired = await self.db.acquire_lease(self.name, self.holder, self.ttl)
+        except Exception:
+            logging.exception("Ошибка продления блокировки лидера")
+            acquired = False
+        self._set_leader(acquired)
+    
+    def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        if leader:
+            logging.info(f"Экземпляр {self.holder} стал лидером")
+            self.on_elected()
+        else:
+            logging.info(f"Экземпляр {self.holder} больше не лидер")
+            self.on_demoted()
\ No newline at end of file
@@ -4,17 +4,26 @@ from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
 
 from config import Config
-from database import Database
+from database import Database, AsyncDatabase
 from handlers import router
+from ingest import JoinIngestor
+from leader import LeaderLease
+from metrics import QUEUE_DEPTH, setup_metrics, start_metrics_server
 from scheduler import setup_scheduler
+from storage import create_storage
+from tenants import TenantRegistry
+from tracing import Profiler, setup_tracing
 from keyboards import get_main_menu
+from outbox import Outbox, broadcast
+from watchdog import LoopWatchdog
+from webhook import run_webhook
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-async def start_command(message, db: Database):
+async def start_command(message, db: AsyncDatabase):
     user_id = message.from_user.id
     
     if db.is_admin(user_id):
@@ -30,16 +39,45 @@ async def start_command(message, db: Database):
 
 async def main():
     config = Config.from_env()
-    db = Database()
+    db = AsyncDatabase(Database())
+    db.start()
+    
+    watchdog = LoopWatchdog(config.loop_lag_threshold_ms)
+    watchdog.start()
     
     bot = Bot(token=config.bot_token)
-    dp = Dispatcher()
+    outbox = Outbox()
+    bot.session.middleware(outbox)
+    dp = Dispatcher(storage=await create_storage(config.fsm_storage, db))
+    setup_metrics(bot, dp)
+    setup_tracing(bot, dp, config.slow_update_ms)
     
     dp.message.register(start_command, Command("start"))
     dp.include_router(router)
     
+    tenants = TenantRegistry(db)
+    await tenants.setup(config)
+    
+    ingestor = JoinIngestor(db)
+    ingestor.start()
+    
+    QUEUE_DEPTH.set_function(lambda: outbox.queue_depth, queue='outbox')
+    QUEUE_DEPTH.set_function(lambda: ingestor.queue_depth, queue='ingest')
+    metrics_runner = None
+    if config.metrics_port:
+        try:
+            metrics_runner = await start_metrics_server(config.metrics_host, config.metrics_port)
+            logging.info(f"Метрики доступны на {config.metrics_host}:{config.metrics_port}/metrics")
+        except OSError as e:
+            logging.warning("Не удалось запустить сервер метрик на %s:%s: %s",
+                            config.metrics_host, config.metrics_port, e)
+    
     dp['db'] = db
     dp['config'] = config
+    dp['ingestor'] = ingestor
+    dp['tenants'] = tenants
+    dp['profiler'] = Profiler()
+    dp['watchdog'] = watchdog
     
     admin_ids = db.get_all_admins()
     if not admin_ids:
@@ -48,26 +86,34 @@ async def main():
     else:
         logging.info(f"Загружено {len(admin_ids)} администратор(ов)")
     
-    scheduler = setup_scheduler(bot, db, admin_ids)
-    scheduler.start()
-    logging.info("Планировщик запущен")
+    scheduler = setup_scheduler(bot, db, config, tenants)
+    leader = LeaderLease(db, on_elected=scheduler.start, on_demoted=scheduler.stop)
+    await leader.start()
+    logging.info("Планировщик запущен" if leader.is_leader else "Планировщик ожидает лидерства")
     
-    for admin_id in admin_ids:
-        try:
-            await bot.send_message(
-                admin_id,
-                f"Бот запущен и готов к работе\n\n"
-                f"Пробный период: 8 дней"
-            )
-        except:
-            pass
+    await broadcast(
+        bot,
+        admin_ids,
+        f"Бот запущен и готов к работе\n\n"
+        f"Пробный период: 8 дней"
+    )
     
     logging.info("Бот запущен")
     try:
-        await dp.start_polling(bot)
+        if config.webhook_url:
+            await run_webhook(bot, dp, config)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
+        await leader.stop()
         scheduler.shutdown()
+        await ingestor.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await bot.session.close()
+        watchdog.stop()
+        db.close()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+from aiogram import Bot
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+MAX_ATTEMPTS = 3
+BACKOFF_SECONDS = 0.5
+REMOVAL_CONCURRENCY = 10
+
+@dataclass
+class ChatRemoval:
+    chat_id: int
+    was_member: Optional[bool] = None
+    removed: bool = False
+    error: Optional[str] = None
+
+@dataclass
+class RemovalResult:
+    user_id: int
+    chats: List[ChatRemoval] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return all(chat.error is None for chat in self.chats)
+
+    @property
+    def removed_from(self) -> List[int]:
+        return [chat.chat_id for chat in self.chats if chat.removed]
+
+    @property
+    def errors(self) -> List[str]:
+        return [f"{chat.chat_id}: {chat.error}" for chat in self.chats if chat.error]
+
+async def is_chat_member(bot: Bot, chat_id: int, user_id: int) -> bool:
+    member = await bot.get_chat_member(chat_id, user_id)
+    return member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED)
+
+async def _with_retry(call, *args):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return await call(*args)
+        except TelegramRetryAfter as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            await asyncio.sleep(e.retry_after)
+        except (TelegramNetworkError, TelegramServerError):
+            if attempt == MAX_ATTEMPTS:
+                raise
+            await asyncio.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+async def _remove_from_chat(bot: Bot, chat_id: int, user_id: int, check_membership: bool) -> ChatRemoval:
+    result = ChatRemoval(chat_id)
+    try:
+        if check_membership:
+            result.was_member = await _with_retry(is_chat_member, bot, chat_id, user_id)
+            if not result.was_member:
+                return result
+
+        await _with_retry(bot.ban_chat_member, chat_id, user_id)
+        await _with_retry(bot.unban_chat_member, chat_id, user_id)
+        result.removed = True
+    except Exception as e:
+        logging.warning("Не удалось удалить %s из чата %s: %s", user_id, chat_id, e)
+        result.error = str(e)
+    return result
+
+async def remove_member(bot: Bot, user_id: int, chat_ids: Iterable[int],
+                        check_membership: bool = True) -> RemovalResult:
+    chats = await asyncio.gather(*(
+        _remove_from_chat(bot, chat_id, user_id, check_membership) for chat_id in chat_ids
+    ))
+    return RemovalResult(user_id, list(chats))
+
+async def remove_members(bot: Bot, user_ids: Iterable[int], chat_ids: Iterable[int],
+                         check_membership: bool = True,
+                         concurrency: int = REMOVAL_CONCURRENCY) -> List[RemovalResult]:
+    chat_ids = list(chat_ids)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def remove(user_id: int) -> RemovalResult:
+        async with semaphore:
+            return await remove_member(bot, user_id, chat_ids, check_membership)
+
+    return list(await asyncio.gather(*(remove(user_id) for user_id in user_ids)))
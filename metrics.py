@@ -0,0 +1,184 @@
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = 'untyped'
+    
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        _registry.append(self)
+    
+    def samples(self):
+        return []
+    
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values = {}
+    
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+    
+    def samples(self):
+        return [(f"{self.name}_total", key, value) for key, value in self._values.items()]
+
+class Gauge(Metric):
+    kind = 'gauge'
+    
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values = {}
+        self._functions = {}
+    
+    def set(self, value: float, **labels):
+        self._values[tuple(sorted(labels.items()))] = value
+    
+    def set_function(self, function: Callable[[], float], **labels):
+        self._functions[tuple(sorted(labels.items()))] = function
+    
+    def samples(self):
+        values = dict(self._values)
+        for key, function in self._functions.items():
+            values[key] = function()
+        return [(self.name, key, value) for key, value in values.items()]
+
+class Histogram(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._values = {}
+    
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        self._values[key] = (counts, total + value)
+    
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def samples(self):
+        samples = []
+        for key, (counts, total) in self._values.items():
+            for bound, count in zip(self.buckets, counts):
+                samples.append((f"{self.name}_bucket", key + (('le', _format_value(bound)),), count))
+            samples.append((f"{self.name}_count", key, counts[-1]))
+            samples.append((f"{self.name}_sum", key, total))
+        return samples
+
+def render() -> str:
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+UPDATE_SECONDS = Histogram('bot_update_seconds', 'Time spent processing an update, by update type')
+UPDATE_ERRORS = Counter('bot_update_errors', 'Updates that raised an exception, by update type')
+HANDLER_SECONDS = Histogram('bot_handler_seconds', 'Handler latency, by handler')
+DB_SECONDS = Histogram('bot_db_seconds', 'Database call latency including queueing, by method')
+DB_ERRORS = Counter('bot_db_errors', 'Database calls that raised an exception, by method')
+API_REQUESTS = Counter('bot_api_requests', 'Bot API calls, by method')
+API_ERRORS = Counter('bot_api_errors', 'Failed Bot API calls, by method and error')
+API_SECONDS = Histogram('bot_api_seconds', 'Bot API call latency, by method')
+JOB_SECONDS = Histogram('bot_scheduler_job_seconds', 'Scheduler job duration, by job')
+LOOP_LAG_SECONDS = Histogram('bot_event_loop_lag_seconds', 'Event loop scheduling lag')
+QUEUE_DEPTH = Gauge('bot_queue_depth', 'Items waiting in in-process queues, by queue')
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        update_type = getattr(event, 'event_type', type(event).__name__)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            UPDATE_ERRORS.inc(type=update_type)
+            raise
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - start, type=update_type)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        with HANDLER_SECONDS.time(handler=name):
+            return await handler(event, data)
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot: Bot, method):
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            API_REQUESTS.inc(method=name)
+            API_SECONDS.observe(time.perf_counter() - start, method=name)
+
+def setup_metrics(bot: Bot, dp: Dispatcher):
+    bot.session.middleware(ApiMetricsMiddleware())
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for name, observer in dp.observers.items():
+        if name not in ('update', 'error'):
+            observer.middleware(HandlerMetricsMiddleware())
+
+async def _metrics_view(request: web.Request) -> web.Response:
+    return web.Response(
+        body=render().encode('utf-8'),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    )
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get('/metrics', _metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    return runner
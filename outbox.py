@@ -0,0 +1,168 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    CopyMessage,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    ForwardMessage,
+    SendDocument,
+    SendMessage,
+)
+
+INTERACTIVE = 0
+BROADCAST = 1
+
+GLOBAL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+MAX_RETRIES = 3
+
+LIMITED_METHODS = (
+    SendMessage,
+    SendDocument,
+    CopyMessage,
+    ForwardMessage,
+    EditMessageText,
+    EditMessageReplyMarkup,
+)
+
+_priority = ContextVar('outbound_priority', default=INTERACTIVE)
+
+@contextmanager
+def outbound_priority(priority: int):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self) -> float:
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+    
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+class Outbox(BaseRequestMiddleware):
+    def __init__(self, global_rate: float = GLOBAL_RATE, private_rate: float = PRIVATE_CHAT_RATE,
+                 group_rate: float = GROUP_CHAT_RATE, max_retries: int = MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._chat_buckets = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._granter = None
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+    
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if not value.is_full()
+                }
+            is_private = isinstance(chat_id, int) and chat_id > 0
+            bucket = TokenBucket(self.private_rate if is_private else self.group_rate)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+    
+    async def _acquire(self, chat_id, priority: int):
+        if chat_id is not None:
+            bucket = self._chat_bucket(chat_id)
+            while (delay := bucket.delay()) > 0:
+                await asyncio.sleep(delay)
+            bucket.consume()
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._granter is None or self._granter.done():
+            self._granter = asyncio.create_task(self._grant())
+        await future
+    
+    async def _grant(self):
+        while self._waiters:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            delay = self.global_bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.global_bucket.consume()
+                future.set_result(None)
+    
+    async def __call__(self, make_request, bot: Bot, method):
+        if not isinstance(method, LIMITED_METHODS):
+            return await make_request(bot, method)
+        
+        chat_id = getattr(method, 'chat_id', None)
+        priority = _priority.get()
+        
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(
+                    "Превышен лимит Telegram для %s, повтор через %s с",
+                    type(method).__name__, e.retry_after
+                )
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                await asyncio.sleep(e.retry_after)
+
+async def broadcast(bot: Bot, chat_ids: Iterable[int], text: str, **kwargs) -> int:
+    chat_ids = list(chat_ids)
+    with outbound_priority(BROADCAST):
+        results = await asyncio.gather(
+            *(bot.send_message(chat_id, text, **kwargs) for chat_id in chat_ids),
+            return_exceptions=True
+        )
+    
+    delivered = 0
+    for chat_id, result in zip(chat_ids, results):
+        if isinstance(result, Exception):
+            logging.warning("Не удалось отправить сообщение %s: %s", chat_id, result)
+        else:
+            delivered += 1
+    return delivered
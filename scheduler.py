@@ -1,55 +1,257 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Optional
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from aiogram import Bot
 
-from database import Database
-from keyboards import get_trial_decision
-from utils import format_user_info
+from config import Config
+from database import AsyncDatabase
+from keyboards import get_digest_keyboard, get_trial_decision
+from metrics import JOB_SECONDS
+from outbox import broadcast
+from tenants import TenantRegistry
+from utils import chunk_list, format_user_info, format_user_page
+
+WARNING_SECONDS = 24 * 60 * 60
+MAX_SLEEP_SECONDS = 300
+RESYNC_MINUTES = 10
+HORIZON_SECONDS = 2 * RESYNC_MINUTES * 60
+DIGEST_PAGE_SIZE = 10
+
+EXPIRED = 'expired'
+WARNING = 'warning'
+
+def _with_tenant(title: str, tenant_name: Optional[str]) -> str:
+    return f"{title} ({tenant_name})" if tenant_name else title
+
+async def _send_digest(bot: Bot, admin_ids: list, title: str, users, show_time: bool):
+    pages = list(chunk_list(users, DIGEST_PAGE_SIZE))
+    now = time.time()
+    
+    for number, page in enumerate(pages, start=1):
+        header = f"{title}: {len(users)}"
+        if len(pages) > 1:
+            header += f" ({number}/{len(pages)})"
+        cards = format_user_page(page, show_time=show_time, now=now)
+        await broadcast(bot, admin_ids, f"{header}\n\n{cards}", reply_markup=get_digest_keyboard(page))
+
+async def notify_expired(bot: Bot, db: AsyncDatabase, users, digest: bool = True,
+                         tenant_name: Optional[str] = None):
+    if not users:
+        return
+    admin_ids = db.get_all_admins()
+    title = _with_tenant("Пробный период завершен", tenant_name)
+    
+    if digest and len(users) > 1:
+        await _send_digest(bot, admin_ids, title, users, show_time=False)
+    else:
+        for user in users:
+            text = f"{title}\n\n{format_user_info(user)}"
+            keyboard = get_trial_decision(user['telegram_id'])
+            await broadcast(bot, admin_ids, text, reply_markup=keyboard)
+    
+    await db.mark_expired_notified([user['telegram_id'] for user in users])
+
+async def notify_expiring(bot: Bot, db: AsyncDatabase, users, digest: bool = True,
+                          tenant_name: Optional[str] = None):
+    if not users:
+        return
+    admin_ids = db.get_all_admins()
+    
+    if digest and len(users) > 1:
+        title = _with_tenant("Пробный период скоро истечет (остался 1 день)", tenant_name)
+        await _send_digest(bot, admin_ids, title, users, show_time=True)
+    else:
+        for user in users:
+            text = (f"{_with_tenant('Пробный период скоро истечет', tenant_name)}\n\n"
+                    f"{format_user_info(user, show_time=True)}\n\n"
+                    f"Остался 1 день")
+            keyboard = get_trial_decision(user['telegram_id'])
+            await broadcast(bot, admin_ids, text, reply_markup=keyboard)
+    
+    await db.mark_notified_many([user['telegram_id'] for user in users])
 
-async def check_expired_trials(bot: Bot, db: Database, admin_ids: list):
-    expired = db.get_expired_trials()
+class ExpiryScheduler:
+    def __init__(self, bot: Bot, db: AsyncDatabase, tenants: Optional[TenantRegistry] = None,
+                 digest: bool = True):
+        self.bot = bot
+        self.db = db
+        self.tenants = tenants
+        self.digest = digest
+        self._heap = []
+        self._pending = set()
+        self._deadlines = {}
+        self._horizon = 0
+        self._refreshes = set()
+        self._wakeup = asyncio.Event()
+        self._loop = None
+        self._task = None
+        self._resync_scheduler = AsyncIOScheduler()
+        self._resync_scheduler.add_job(self.resync, 'interval', minutes=RESYNC_MINUTES)
+        db.sync.subscribe(self._on_user_changed)
+    
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._task = self._loop.create_task(self._run())
+        if not self._resync_scheduler.running:
+            self._resync_scheduler.start()
+        else:
+            self._resync_scheduler.resume()
+    
+    def stop(self):
+        if self._resync_scheduler.running:
+            self._resync_scheduler.pause()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._refreshes):
+            task.cancel()
+    
+    def shutdown(self):
+        self.stop()
+        if self._resync_scheduler.running:
+            self._resync_scheduler.shutdown(wait=False)
+    
+    def _on_user_changed(self, telegram_ids):
+        if self._loop is None or self._task is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._start_refresh, telegram_ids)
+        except RuntimeError:
+            pass
     
-    for user in expired:
-        text = f"Пробный период завершен\n\n{format_user_info(user)}"
-        keyboard = get_trial_decision(user['telegram_id'])
+    def _start_refresh(self, telegram_ids):
+        task = self._loop.create_task(self._refresh(telegram_ids))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
+    
+    def _refresh_done(self, task: asyncio.Task):
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception():
+            logging.error("Не удалось обновить сроки пробного периода", exc_info=task.exception())
+    
+    async def _refresh(self, telegram_ids):
+        users = {user['telegram_id']: user for user in await self.db.get_users(telegram_ids)}
+        for telegram_id in telegram_ids:
+            self._track(telegram_id, users.get(telegram_id))
+    
+    async def resync(self):
+        horizon = int(time.time()) + HORIZON_SECONDS
+        with JOB_SECONDS.time(job='resync'):
+            users = await self.db.read(self.db.sync.get_pending_trials, horizon + WARNING_SECONDS)
+        self._horizon = horizon
+        self._heap = []
+        self._pending = set()
+        self._deadlines = {}
+        for user in users:
+            self._track(user['telegram_id'], user)
+        self._wakeup.set()
+    
+    def _track(self, telegram_id: int, user):
+        if user is None or user['status'] != 'trial':
+            self._deadlines.pop(telegram_id, None)
+            return
         
-        for admin_id in admin_ids:
-            try:
-                await bot.send_message(admin_id, text, reply_markup=keyboard)
-            except:
-                continue
-
-async def check_expiring_soon(bot: Bot, db: Database, admin_ids: list):
-    expiring = db.get_users_expiring_soon(hours=24)
-    
-    for user in expiring:
-        text = (f"Пробный период скоро истечет\n\n"
-                f"{format_user_info(user, show_time=True)}\n\n"
-                f"Остался 1 день")
-        keyboard = get_trial_decision(user['telegram_id'])
+        trial_end = user['trial_end_date']
+        if trial_end > self._horizon + WARNING_SECONDS:
+            self._deadlines.pop(telegram_id, None)
+            return
+        
+        self._deadlines[telegram_id] = trial_end
+        earliest = self._heap[0][0] if self._heap else None
         
-        for admin_id in admin_ids:
+        if not user['notified_one_day'] and trial_end > time.time():
+            self._push(trial_end - WARNING_SECONDS, WARNING, telegram_id)
+        if not user['notified_expired'] and trial_end <= self._horizon:
+            self._push(trial_end, EXPIRED, telegram_id)
+        
+        if earliest is None or self._heap[0][0] < earliest:
+            self._wakeup.set()
+    
+    def _push(self, when: int, kind: str, telegram_id: int):
+        entry = (when, kind, telegram_id)
+        if entry not in self._pending:
+            self._pending.add(entry)
+            heapq.heappush(self._heap, entry)
+    
+    def _is_current(self, when: int, kind: str, telegram_id: int) -> bool:
+        trial_end = self._deadlines.get(telegram_id)
+        if trial_end is None:
+            return False
+        if kind == WARNING:
+            return when == trial_end - WARNING_SECONDS
+        return when == trial_end
+    
+    def _pop_due(self, now: float) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            self._pending.discard(entry)
+            if self._is_current(*entry):
+                due.append(entry)
+        return due
+    
+    async def _run(self):
+        await self.resync()
+        while True:
+            self._wakeup.clear()
+            delay = MAX_SLEEP_SECONDS
+            if self._heap:
+                delay = min(delay, max(0, self._heap[0][0] - time.time()))
             try:
-                await bot.send_message(admin_id, text, reply_markup=keyboard)
-            except:
-                continue
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            
+            due = self._pop_due(time.time())
+            if due:
+                try:
+                    with JOB_SECONDS.time(job='notify'):
+                        await self._fire(due)
+                except Exception:
+                    logging.exception("Ошибка уведомления о пробных периодах")
+    
+    async def _fire(self, due: list):
+        users = {
+            user['telegram_id']: user
+            for user in await self.db.get_users({telegram_id for _, _, telegram_id in due})
+            if user['status'] == 'trial'
+        }
+        now = time.time()
         
-        db.mark_notified(user['telegram_id'])
-
-def setup_scheduler(bot: Bot, db: Database, admin_ids: list) -> AsyncIOScheduler:
-    scheduler = AsyncIOScheduler()
-    
-    scheduler.add_job(
-        check_expired_trials,
-        'interval',
-        hours=1,
-        args=[bot, db, admin_ids]
-    )
-    
-    scheduler.add_job(
-        check_expiring_soon,
-        'interval',
-        hours=1,
-        args=[bot, db, admin_ids]
-    )
-    
-    return scheduler
\ No newline at end of file
+        expiring = [
+            users[telegram_id] for _, kind, telegram_id in due
+            if kind == WARNING and telegram_id in users
+            and not users[telegram_id]['notified_one_day']
+            and users[telegram_id]['trial_end_date'] > now
+        ]
+        expired = [
+            users[telegram_id] for _, kind, telegram_id in due
+            if kind == EXPIRED and telegram_id in users
+            and not users[telegram_id]['notified_expired']
+        ]
+        
+        for tenant_name, group in self._by_tenant(expiring):
+            await notify_expiring(self.bot, self.db, group, self.digest, tenant_name)
+        for tenant_name, group in self._by_tenant(expired):
+            await notify_expired(self.bot, self.db, group, self.digest, tenant_name)
+    
+    def _by_tenant(self, users: list):
+        if not self.tenants or len(self.tenants.all) < 2:
+            return [(None, users)] if users else []
+        
+        groups = {}
+        for user in users:
+            groups.setdefault(user['tenant_id'], []).append(user)
+        return [
+            (tenant.name if (tenant := self.tenants.get(tenant_id)) else None, group)
+            for tenant_id, group in groups.items()
+        ]
+
+def setup_scheduler(bot: Bot, db: AsyncDatabase, config: Config,
+                    tenants: Optional[TenantRegistry] = None) -> ExpiryScheduler:
+    return ExpiryScheduler(bot, db, tenants, digest=config.notify_digest)
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database import AsyncDatabase
+
+STATE_TTL_SECONDS = 15 * 60
+MAX_STATES = 10000
+
+_UNSET = object()
+
+def _storage_key(key: StorageKey) -> str:
+    return ':'.join(str(part) for part in (
+        key.bot_id,
+        key.chat_id,
+        key.user_id,
+        key.thread_id or 0,
+        key.business_connection_id or '',
+        key.destiny,
+    ))
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+class TTLMemoryStorage(BaseStorage):
+    def __init__(self, ttl: int = STATE_TTL_SECONDS, max_states: int = MAX_STATES):
+        self.ttl = ttl
+        self.max_states = max_states
+        self._records = OrderedDict()
+    
+    def _get(self, key: StorageKey):
+        record = self._records.get(_storage_key(key))
+        if record is None:
+            return None, {}
+        state, data, expires_at = record
+        if expires_at <= time.monotonic():
+            del self._records[_storage_key(key)]
+            return None, {}
+        return state, data
+    
+    def _set(self, key: StorageKey, state=_UNSET, data=_UNSET):
+        current_state, current_data = self._get(key)
+        state = current_state if state is _UNSET else state
+        data = current_data if data is _UNSET else data
+        name = _storage_key(key)
+        
+        if state is None and not data:
+            self._records.pop(name, None)
+            return
+        
+        self._records[name] = (state, data, time.monotonic() + self.ttl)
+        self._records.move_to_end(name)
+        while len(self._records) > self.max_states:
+            self._records.popitem(last=False)
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._set(key, state=_state_name(state))
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._get(key)[0]
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self._set(key, data=data.copy())
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._get(key)[1].copy()
+    
+    async def close(self) -> None:
+        self._records.clear()
+
+class SQLiteStorage(TTLMemoryStorage):
+    def __init__(self, db: AsyncDatabase, ttl: int = STATE_TTL_SECONDS, max_states: int = MAX_STATES):
+        super().__init__(ttl, max_states)
+        self.db = db
+        self._version = None
+        self._lock = asyncio.Lock()
+    
+    async def load(self) -> None:
+        version, records = await self.db.read(self.db.sync.get_fsm_records, self.max_states)
+        offset = time.monotonic() - time.time()
+        self._records.clear()
+        for record in records:
+            self._records[record['key']] = (
+                record['state'],
+                json.loads(record['data']),
+                record['expires_at'] + offset
+            )
+        self._version = version
+    
+    async def _is_current(self) -> bool:
+        return await self.db.read(self.db.sync.get_fsm_version) == self._version
+    
+    async def _sync(self) -> None:
+        if await self._is_current():
+            return
+        async with self._lock:
+            if not await self._is_current():
+                await self.load()
+    
+    async def _save(self, key: StorageKey) -> None:
+        state, data = self._get(key)
+        version = await self.db.set_fsm_record(
+            _storage_key(key),
+            state,
+            json.dumps(data, ensure_ascii=False),
+            self.ttl,
+            self.max_states
+        )
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+        else:
+            self._version = None
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        async with self._lock:
+            await super().set_state(key, state)
+            await self._save(key)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        await self._sync()
+        return await super().get_state(key)
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        async with self._lock:
+            await super().set_data(key, data)
+            await self._save(key)
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        await self._sync()
+        return await super().get_data(key)
+
+async def create_storage(kind: str, db: AsyncDatabase) -> BaseStorage:
+    if kind == 'memory':
+        return TTLMemoryStorage()
+    storage = SQLiteStorage(db)
+    await storage.load()
+    return storage
@@ -0,0 +1,73 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from config import Config
+from database import AsyncDatabase
+
+RELOAD_INTERVAL = 60
+
+@dataclass(frozen=True)
+class Tenant:
+    id: int
+    name: str
+    work_chat_id: int
+    study_group_id: int
+    trial_minutes: int
+    
+    @property
+    def chat_ids(self) -> List[int]:
+        return [self.work_chat_id, self.study_group_id]
+
+class TenantRegistry:
+    def __init__(self, db: AsyncDatabase):
+        self.db = db
+        self.default_id = None
+        self._tenants: Dict[int, Tenant] = {}
+        self._by_chat: Dict[int, Tenant] = {}
+        self._loaded_at = 0.0
+    
+    async def setup(self, config: Config):
+        self.default_id = await self.db.ensure_default_tenant(
+            config.work_chat_id, config.study_group_id, config.trial_minutes
+        )
+        await self.reload()
+    
+    async def reload(self):
+        tenants = {row['id']: Tenant(**dict(row)) for row in await self.db.get_tenants()}
+        by_chat = {}
+        for tenant in tenants.values():
+            for chat_id in tenant.chat_ids:
+                by_chat[chat_id] = tenant
+        self._tenants, self._by_chat = tenants, by_chat
+        self._loaded_at = time.monotonic()
+    
+    @property
+    def all(self) -> List[Tenant]:
+        return list(self._tenants.values())
+    
+    @property
+    def default(self) -> Optional[Tenant]:
+        return self._tenants.get(self.default_id)
+    
+    def get(self, tenant_id: Optional[int]) -> Optional[Tenant]:
+        return self._tenants.get(tenant_id if tenant_id is not None else self.default_id)
+    
+    def for_user(self, user) -> Optional[Tenant]:
+        return self.get(user['tenant_id'])
+    
+    def chats_for(self, user) -> List[int]:
+        tenant = self.for_user(user) if user else self.default
+        return tenant.chat_ids if tenant else []
+    
+    async def by_chat(self, chat_id: int) -> Optional[Tenant]:
+        tenant = self._by_chat.get(chat_id)
+        if tenant is None and time.monotonic() - self._loaded_at >= RELOAD_INTERVAL:
+            await self.reload()
+            tenant = self._by_chat.get(chat_id)
+        return tenant
+    
+    async def add(self, name: str, work_chat_id: int, study_group_id: int, trial_minutes: int) -> Tenant:
+        await self.db.add_tenant(name, work_chat_id, study_group_id, trial_minutes)
+        await self.reload()
+        return self._by_chat[work_chat_id]
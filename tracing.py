@@ -0,0 +1,98 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+SLOW_UPDATE_MS = 1000
+TOP_SPANS = 10
+PROFILE_LINES = 60
+
+_current_trace = ContextVar('current_trace', default=None)
+
+class Trace:
+    def __init__(self, update_id: int, update_type: str):
+        self.update_id = update_id
+        self.update_type = update_type
+        self.spans = []
+    
+    def add(self, kind: str, name: str, duration: float):
+        self.spans.append((kind, name, duration))
+    
+    def breakdown(self) -> str:
+        totals = {}
+        for kind, name, duration in self.spans:
+            count, total = totals.get((kind, name), (0, 0.0))
+            totals[(kind, name)] = (count + 1, total + duration)
+        
+        lines = []
+        for (kind, name), (count, total) in sorted(totals.items(), key=lambda item: -item[1][1])[:TOP_SPANS]:
+            lines.append(f"{kind} {name} x{count}: {total * 1000:.1f} мс")
+        return "; ".join(lines) or "нет вызовов БД и API"
+
+def add_span(kind: str, name: str, duration: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(kind, name, duration)
+
+class TracingMiddleware(BaseMiddleware):
+    def __init__(self, threshold_ms: float = SLOW_UPDATE_MS):
+        self.threshold = threshold_ms / 1000
+    
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        trace = Trace(getattr(event, 'update_id', 0), getattr(event, 'event_type', type(event).__name__))
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            _current_trace.reset(token)
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                logging.warning(
+                    "Медленное обновление %s (%s): %.0f мс; %s",
+                    trace.update_id, trace.update_type, elapsed * 1000, trace.breakdown()
+                )
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot: Bot, method):
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            add_span('api', type(method).__name__, time.perf_counter() - start)
+
+def setup_tracing(bot: Bot, dp: Dispatcher, threshold_ms: float = SLOW_UPDATE_MS):
+    bot.session.middleware(TracingRequestMiddleware())
+    dp.update.outer_middleware(TracingMiddleware(threshold_ms))
+
+class Profiler:
+    def __init__(self):
+        self._profile: Optional[cProfile.Profile] = None
+        self._started = 0.0
+    
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+    
+    def start(self):
+        self._profile = cProfile.Profile()
+        self._started = time.monotonic()
+        self._profile.enable()
+    
+    def stop(self) -> str:
+        self._profile.disable()
+        out = io.StringIO()
+        out.write(f"Профиль за {time.monotonic() - self._started:.1f} с\n\n")
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_LINES)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(PROFILE_LINES)
+        self._profile = None
+        return out.getvalue()
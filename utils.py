@@ -1,17 +1,23 @@
-from datetime import datetime
+import time
+from functools import lru_cache
 from typing import Optional
 
+CARD_CACHE_SIZE = 4096
+LIST_ITEM_CACHE_SIZE = 4096
+PAGE_CACHE_SIZE = 256
+
 def format_username(username: Optional[str]) -> str:
     return f"@{username}" if username else "тег отсутствует"
 
 def get_status_emoji(status: str) -> str:
     return "🟢" if status == "approved" else "🟡"
 
-def minutes_remaining(trial_end: str) -> int:
-    end_date = datetime.fromisoformat(trial_end)
-    delta = end_date - datetime.now()
-    return max(0, int(delta.total_seconds() / 60))
+def minutes_remaining(trial_end: int, now: Optional[float] = None) -> int:
+    if now is None:
+        now = time.time()
+    return max(0, int((trial_end - now) / 60))
 
+@lru_cache(maxsize=CARD_CACHE_SIZE)
 def format_time_remaining(minutes: int) -> str:
     if minutes <= 0:
         return "Истек"
@@ -22,32 +28,53 @@ def format_time_remaining(minutes: int) -> str:
     
     return f"{days} д. {hours} ч. {mins} мин."
 
-def format_user_info(user, show_time: bool = False) -> str:
-    name = user['name']
-    uid = user['telegram_id']
-    tag = format_username(user['username'])
-    status = get_status_emoji(user['status'])
-    
-    info = f"{status} {name}\nID: {uid}\n{tag}"
+def _card_key(user) -> tuple:
+    return user['telegram_id'], user['name'], user['username'], user['status']
+
+@lru_cache(maxsize=CARD_CACHE_SIZE)
+def _card_static(telegram_id: int, name: str, username: Optional[str], status: str) -> str:
+    return f"{get_status_emoji(status)} {name}\nID: {telegram_id}\n{format_username(username)}"
+
+@lru_cache(maxsize=LIST_ITEM_CACHE_SIZE)
+def _list_item_static(telegram_id: int, name: str, username: Optional[str]) -> str:
+    return f"{telegram_id} | {format_username(username)} | {name}"
+
+def format_user_info(user, show_time: bool = False, now: Optional[float] = None) -> str:
+    info = _card_static(*_card_key(user))
     
     if show_time and user['status'] == 'trial':
-        minutes = minutes_remaining(user['trial_end_date'])
-        time_str = format_time_remaining(minutes)
+        time_str = format_time_remaining(minutes_remaining(user['trial_end_date'], now))
         info += f"\nОсталось: {time_str}"
     
     return info
 
-def format_user_list_item(user, show_status: bool = True) -> str:
-    uid = user['telegram_id']
-    tag = format_username(user['username'])
-    name = user['name']
-    
-    result = f"{uid} | {tag} | {name}"
+@lru_cache(maxsize=PAGE_CACHE_SIZE)
+def _cards_page(cards: tuple) -> str:
+    rendered = []
+    for telegram_id, name, username, status, minutes in cards:
+        info = _card_static(telegram_id, name, username, status)
+        if minutes is not None:
+            info += f"\nОсталось: {format_time_remaining(minutes)}"
+        rendered.append(info)
+    return "\n\n".join(rendered)
+
+def format_user_page(users, show_time: bool = False, now: Optional[float] = None) -> str:
+    if now is None:
+        now = time.time()
+    return _cards_page(tuple(
+        _card_key(user) + (
+            minutes_remaining(user['trial_end_date'], now)
+            if show_time and user['status'] == 'trial' else None,
+        )
+        for user in users
+    ))
+
+def format_user_list_item(user, show_status: bool = True, now: Optional[float] = None) -> str:
+    result = _list_item_static(user['telegram_id'], user['name'], user['username'])
     
     if show_status:
         if user['status'] == 'trial':
-            minutes = minutes_remaining(user['trial_end_date'])
-            time_str = format_time_remaining(minutes)
+            time_str = format_time_remaining(minutes_remaining(user['trial_end_date'], now))
             result += f" | 🟡 {time_str}"
         else:
             result += " | 🟢 Оставлен"
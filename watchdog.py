@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from metrics import LOOP_LAG_SECONDS
+
+CHECK_INTERVAL = 0.1
+LAG_THRESHOLD_MS = 250
+REPORT_INTERVAL = 300
+MAX_SAMPLES = 6000
+
+def _percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+class LoopWatchdog:
+    def __init__(self, threshold_ms: float = LAG_THRESHOLD_MS, interval: float = CHECK_INTERVAL,
+                 report_interval: float = REPORT_INTERVAL):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.report_interval = report_interval
+        self._samples = deque(maxlen=MAX_SAMPLES)
+        self._beat = time.monotonic()
+        self._reported_beat = None
+        self._loop_thread_id = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._task = None
+        self._report_task = None
+    
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._report_task = asyncio.create_task(self._report())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stopped.set()
+        for task in (self._task, self._report_task):
+            if task:
+                task.cancel()
+        self._task = self._report_task = None
+    
+    def summary(self) -> str:
+        if not self._samples:
+            return "Нет данных о задержке цикла событий"
+        samples = list(self._samples)
+        return (f"Задержка цикла событий ({len(samples)} замеров): "
+                f"p50 {_percentile(samples, 0.5) * 1000:.1f} мс, "
+                f"p95 {_percentile(samples, 0.95) * 1000:.1f} мс, "
+                f"p99 {_percentile(samples, 0.99) * 1000:.1f} мс, "
+                f"макс {max(samples) * 1000:.1f} мс")
+    
+    async def _measure(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(0.0, now - expected)
+            self._samples.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self.threshold:
+                logging.warning("Цикл событий был заблокирован на %.0f мс", lag * 1000)
+    
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logging.info(self.summary())
+    
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._beat
+            if time.monotonic() - beat < self.threshold + self.interval or beat == self._reported_beat:
+                continue
+            
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            logging.warning(
+                "Цикл событий не отвечает дольше %.0f мс, текущий стек:\n%s",
+                self.threshold * 1000, stack
+            )
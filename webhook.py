@@ -0,0 +1,43 @@
+import asyncio
+import logging
+import secrets
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import Config
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, config: Config, secret_token: str) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token
+    ).register(app, path=config.webhook_path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(bot: Bot, dp: Dispatcher, config: Config):
+    secret_token = config.webhook_secret
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        logging.info("WEBHOOK_SECRET не задан, используется случайный секрет до перезапуска")
+    
+    app = create_webhook_app(bot, dp, config, secret_token)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.webhook_host, config.webhook_port)
+    await site.start()
+    
+    await bot.set_webhook(
+        f"{config.webhook_url.rstrip('/')}{config.webhook_path}",
+        secret_token=secret_token,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    logging.info(f"Webhook слушает {config.webhook_host}:{config.webhook_port}{config.webhook_path}")
+    
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
\ No newline at end of file